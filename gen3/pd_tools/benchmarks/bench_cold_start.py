@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+"""Measure tool cold start with and without the runtime `pip install requests`.
+
+Each sample is a fresh interpreter that imports http_client, the way a tool
+container starts:
+
+  pip-install  pip installs requests==2.32.3 into an empty directory first
+               (what every Tool.content used to do), then imports it
+  requests     requests already present in the image
+  stdlib       PD_TOOLS_HTTP_TRANSPORT=stdlib, no third-party packages
+
+    python gen3/pd_tools/benchmarks/bench_cold_start.py --runs 5
+
+The pip-install mode needs network access to PyPI.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "pager_duty_incident")
+
+def _import_client(transport, extra_path=None):
+    env = dict(os.environ, PD_TOOLS_HTTP_TRANSPORT=transport)
+    env["PYTHONPATH"] = os.pathsep.join(path for path in (extra_path, TOOLS_DIR) if path)
+    subprocess.run(
+        [sys.executable, "-c", "import http_client; print(http_client.TRANSPORT)"],
+        env=env, check=True, capture_output=True,
+    )
+
+def _pip_install_then_import():
+    with tempfile.TemporaryDirectory() as target:
+        subprocess.run(
+            [sys.executable, "-m", "pip", "install", "--quiet", "--no-cache-dir", "--disable-pip-version-check",
+             "--target", target, "requests==2.32.3"],
+            check=True, capture_output=True,
+        )
+        _import_client("requests", extra_path=target)
+
+def _requests_installed():
+    try:
+        import requests  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tool cold start with and without pip install.")
+    parser.add_argument("--runs", type=int, default=5, help="Samples per mode")
+    parser.add_argument("--skip-pip", action="store_true", help="Skip the pip-install mode (no network)")
+    args = parser.parse_args()
+
+    modes = {"stdlib": lambda: _import_client("stdlib")}
+    if _requests_installed():
+        modes["requests"] = lambda: _import_client("requests")
+    if not args.skip_pip:
+        modes["pip-install"] = _pip_install_then_import
+
+    print(f"{'mode':12} {'p50 ms':>9} {'min ms':>9} {'max ms':>9}")
+    for mode, run in modes.items():
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            run()
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"{mode:12} {statistics.median(timings):9.1f} {min(timings):9.1f} {max(timings):9.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+
+"""Compare per-call connections with http_client's pooled sessions.
+
+Runs the HTTP call pattern of each PagerDuty tool against local TLS stub
+servers, once with a bare `requests.<method>` per call (new TCP + TLS
+handshake every time, as the scripts used to do) and once through
+`http_client` (one keep-alive session per host).
+
+    python gen3/pd_tools/benchmarks/bench_connection_reuse.py --runs 20 --handshake-latency 0.03
+
+`--handshake-latency` delays every new connection on the server side to
+stand in for the network round trips of a real TCP + TLS handshake.
+"""
+
+import argparse
+import os
+import ssl
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "pager_duty_incident"))
+
+import requests  # noqa: E402
+
+import http_client  # noqa: E402
+
+# (host, method) sequence each tool issues per run.
+WORKFLOWS = {
+    "page_oncall_engineer": [("pagerduty", "POST")],
+    "webhook_incident_response": [("slack", "GET"), ("freshservice", "POST"), ("slack", "POST")],
+    "trigger_major_incident": [
+        ("login", "POST"),
+        ("pagerduty", "GET"),
+        ("pagerduty", "POST"),
+        ("freshservice", "POST"),
+        ("graph", "POST"),
+        ("slack", "GET"),
+        ("slack", "POST"),
+        ("pagerduty", "PUT"),
+        ("freshservice", "PUT"),
+    ],
+}
+
+# One loopback address per vendor, so http_client keeps one session per stub
+# exactly as it keeps one per vendor host.
+_STUB_ADDRESSES = {
+    "pagerduty": "127.0.0.2",
+    "freshservice": "127.0.0.3",
+    "slack": "127.0.0.4",
+    "graph": "127.0.0.5",
+    "login": "127.0.0.6",
+}
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        body = b'{"ok": true}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+class _TLSStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, context, handshake_latency):
+        super().__init__((address, 0), _StubHandler)
+        self.context = context
+        self.handshake_latency = handshake_latency
+        self.connections = 0
+
+    def finish_request(self, request, client_address):
+        self.connections += 1
+        time.sleep(self.handshake_latency)
+        tls_request = self.context.wrap_socket(request, server_side=True)
+        super().finish_request(tls_request, client_address)
+
+def _self_signed_cert(directory):
+    cert = os.path.join(directory, "cert.pem")
+    key = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-addext", "subjectAltName=" + ",".join(f"IP:{ip}" for ip in _STUB_ADDRESSES.values()),
+         "-keyout", key, "-out", cert],
+        check=True, capture_output=True,
+    )
+    return cert, key
+
+def _start_servers(cert, key, handshake_latency):
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert, key)
+    servers = {}
+    for name, address in _STUB_ADDRESSES.items():
+        server = _TLSStubServer(address, context, handshake_latency)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers[name] = server
+    return servers
+
+def _run_workflow(calls, servers, pooled, cert):
+    for host, method in calls:
+        address, port = servers[host].server_address
+        url = f"https://{address}:{port}/{host}"
+        if pooled:
+            http_client.request(method, url, json={}, verify=cert).raise_for_status()
+        else:
+            requests.request(method, url, json={}, verify=cert).raise_for_status()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled vs per-call HTTP connections.")
+    parser.add_argument("--runs", type=int, default=20, help="Workflow runs per mode")
+    parser.add_argument("--handshake-latency", type=float, default=0.0, help="Extra seconds added to every new connection")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = _self_signed_cert(directory)
+        servers = _start_servers(cert, key, args.handshake_latency)
+
+        print(f"{'workflow':28} {'mode':8} {'p50 ms':>8} {'mean ms':>8} {'conns/run':>10}")
+        for workflow, calls in WORKFLOWS.items():
+            for pooled in (False, True):
+                for server in servers.values():
+                    server.connections = 0
+                timings = []
+                for _ in range(args.runs):
+                    # Every tool run is a fresh process, so start each run without warm sessions.
+                    http_client._sessions.clear()
+                    start = time.perf_counter()
+                    _run_workflow(calls, servers, pooled, cert)
+                    timings.append((time.perf_counter() - start) * 1000)
+                connections = sum(server.connections for server in servers.values())
+                print(
+                    f"{workflow:28} {'pooled' if pooled else 'per-call':8} "
+                    f"{statistics.median(timings):8.2f} {statistics.mean(timings):8.2f} "
+                    f"{connections / args.runs:10.2f}"
+                )
+
+if __name__ == "__main__":
+    main()
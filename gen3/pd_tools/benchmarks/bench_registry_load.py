@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""Measure how long loading the `aedm` tool registry takes.
+
+Each sample is a fresh interpreter that imports kubiya_sdk and then
+pager_duty_incident/tool-def.py, the way the registry is discovered. The SDK
+import is timed separately, since it doesn't depend on this repo:
+
+    python gen3/pd_tools/benchmarks/bench_registry_load.py --runs 20
+
+To compare against another revision, check it out with `git worktree add`
+and point --tools-dir at its gen3/pd_tools/tools.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools")
+
+_LOAD = """
+import importlib, json, time
+start = time.perf_counter()
+from kubiya_sdk import tool_registry
+sdk = time.perf_counter()
+importlib.import_module("pager_duty_incident.tool-def")
+tools = tool_registry.list_tools("aedm")
+done = time.perf_counter()
+print(json.dumps({"sdk": sdk - start, "registry": done - sdk, "tools": len(tools)}))
+"""
+
+def _sample(tools_dir):
+    env = dict(os.environ, PYTHONPATH=tools_dir)
+    result = subprocess.run([sys.executable, "-c", _LOAD], env=env, check=True, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loading the aedm tool registry.")
+    parser.add_argument("--runs", type=int, default=20, help="Fresh interpreters to sample")
+    parser.add_argument("--tools-dir", default=TOOLS_DIR, help="Directory containing the pager_duty_incident package")
+    args = parser.parse_args()
+
+    samples = [_sample(os.path.abspath(args.tools_dir)) for _ in range(args.runs)]
+    print(f"{samples[0]['tools']} tools registered")
+    print(f"{'phase':10} {'p50 ms':>9} {'min ms':>9} {'max ms':>9}")
+    for phase in ("sdk", "registry"):
+        timings = [sample[phase] * 1000 for sample in samples]
+        print(f"{phase:10} {statistics.median(timings):9.2f} {min(timings):9.2f} {max(timings):9.2f}")
+
+if __name__ == "__main__":
+    main()
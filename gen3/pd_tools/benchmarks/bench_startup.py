@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+"""Break tool runs down into startup phases: fake_tool against the real PD tools.
+
+Each sample runs a script in a fresh interpreter the way a tool container
+does, with PD_TOOLS_CONTAINER_ENTRY_NS stamped just before launch. fake_tool
+prints its startup report. The real tools put theirs in the "startup"
+section of the trace they write to stderr. Both have the same phases:
+
+  container_entry_to_interpreter_start  shell work before python runs
+  interpreter_start_to_imports_done     interpreter startup and imports
+  imports_done_to_exit                  the tool's actual work
+
+The real tools call the local vendor stubs from bench_workflows.py, with a
+fresh state directory per run, so their work phase includes cold caches:
+
+    python gen3/pd_tools/benchmarks/bench_startup.py --runs 10 --latency-ms 50
+
+interpreter_start is read from /proc, so it is only as precise as the
+kernel's 10 ms clock tick.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from bench_workflows import STUBS, TOOLS_DIR, WORKFLOW_ARGS, StubServer, _configure_env
+
+PHASES = {
+    "container_entry_to_interpreter_start": "shell ms",
+    "interpreter_start_to_imports_done": "python+imports ms",
+    "imports_done_to_exit": "work ms",
+}
+
+def _startup_report(script, args, state_dir):
+    env = dict(os.environ, PD_TOOLS_STATE_DIR=state_dir, PD_TOOLS_CONTAINER_ENTRY_NS=str(time.time_ns()))
+    result = subprocess.run(
+        [sys.executable, os.path.join(TOOLS_DIR, f"{script}.py")] + args,
+        env=env, cwd=state_dir, check=True, capture_output=True, text=True,
+    )
+    for line in (result.stdout + result.stderr).splitlines():
+        if line.startswith("{"):
+            output = json.loads(line)
+            report = output.get("startup") or (output if output.get("tool") == "fake-tool" else None)
+            if report:
+                return report["phases_ms"]
+    raise Exception(f"{script} printed no startup report")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tool startup phases.")
+    parser.add_argument("--runs", type=int, default=10, help="Runs per tool")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latency of every stub response")
+    args = parser.parse_args()
+
+    stubs = {host: StubServer(route, args.latency_ms / 1000, 0, 0, 0, 0) for host, route in STUBS.items()}
+    state_root = tempfile.mkdtemp(prefix="pd-tools-bench-")
+    _configure_env(stubs, state_root)
+
+    tools = {"fake_tool": []}
+    tools.update(WORKFLOW_ARGS)
+    print(f"{'tool':28}" + "".join(f" {label:>18}" for label in PHASES.values()))
+    try:
+        for script, script_args in tools.items():
+            samples = [_startup_report(script, script_args, tempfile.mkdtemp(dir=state_root)) for _ in range(args.runs)]
+            medians = [statistics.median(sample.get(phase, float("nan")) for sample in samples) for phase in PHASES]
+            print(f"{script:28}" + "".join(f" {median:18.1f}" for median in medians))
+    finally:
+        for stub in stubs.values():
+            stub.close()
+
+if __name__ == "__main__":
+    main()
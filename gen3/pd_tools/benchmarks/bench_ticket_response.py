@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+"""Per-webhook cost of the old response.json round trip vs parsing in memory.
+
+webhook_incident_response used to write the Freshservice response body to
+./response.json and read it back to find the ticket ID. This times that
+round trip against parsing the same body straight from the response.
+
+    python gen3/pd_tools/benchmarks/bench_ticket_response.py --iterations 5000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+# Roughly the size and shape of a Freshservice v2 "create ticket" response.
+RESPONSE_BODY = json.dumps({
+    "ticket": {
+        "id": 123456,
+        "status": 2,
+        "priority": 1,
+        "source": 8,
+        "subject": "TESTING checkout-api - Checkout is failing",
+        "description": "Checkout is failing</br><strong>Incident Commander:</strong>Jane Doe" * 4,
+        "description_text": "Checkout is failing Incident Commander: Jane Doe" * 4,
+        "tags": ["PDID_Q1ABCDEF"],
+        "category": "DevOps",
+        "sub_category": "Pageout",
+        "custom_fields": {f"field_{i}": None for i in range(30)},
+        "attachments": [],
+        "cc_emails": [],
+        "created_at": "2024-01-01T00:00:00Z",
+        "updated_at": "2024-01-01T00:00:00Z",
+    }
+})
+
+def disk_round_trip():
+    with open("response.json", "w") as f:
+        f.write(RESPONSE_BODY)
+    with open("response.json", "r") as f:
+        response = json.load(f)
+    return response.get("ticket", {}).get("id", "")
+
+def in_memory():
+    ticket = json.loads(RESPONSE_BODY)["ticket"]
+    return ticket["id"], ticket["status"]
+
+def _time(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ticket response handling.")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        disk = _time(disk_round_trip, args.iterations)
+    memory = _time(in_memory, args.iterations)
+    print(f"response.json round trip: {disk:8.1f} us/webhook")
+    print(f"in-memory parse:          {memory:8.1f} us/webhook")
+    print(f"saved:                    {disk - memory:8.1f} us/webhook")
+
+if __name__ == "__main__":
+    main()
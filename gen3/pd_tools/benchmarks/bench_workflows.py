@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+
+"""End-to-end latency of the incident workflows against local stand-ins for every vendor API.
+
+Starts one stub HTTP server per external host the tools call (PagerDuty,
+Freshservice, Slack, Microsoft Graph, Azure login), points http_client at
+them through PD_TOOLS_BASE_URL_OVERRIDES, and runs each workflow's main()
+in-process, reporting p50/p95/p99 latency, the median time until the first
+Slack post (the announcement) and vendor calls per run:
+
+    python gen3/pd_tools/benchmarks/bench_workflows.py --runs 50 --latency-ms 80 --error-rate 0.02 --throttle-rate 0.05
+
+Each stub request waits --latency-ms (plus up to --jitter-ms), then fails
+with a 503 at --error-rate or a 429 with Retry-After at --throttle-rate.
+Every run starts with fresh HTTP sessions, as each tool run is a new
+container. The shared state directory (token cache, Slack directory,
+on-call roster, circuit breakers) persists across runs, as the tools'
+volume does, unless --cold-state is given. The client-side rate limits are
+lifted so that they don't dominate the numbers; --keep-rate-limits keeps them.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "pager_duty_incident")
+
+REPORTER_EMAIL = "reporter@example.com"
+_ids = itertools.count(1)
+# When each Slack message was posted, to time how long a run takes to announce.
+_slack_posts = []
+
+def _pagerduty(method, path):
+    if method == "GET" and path == "/oncalls":
+        return 200, {
+            "oncalls": [{
+                "user": {"id": "PSTUBU1", "summary": "Stub Engineer"},
+                "escalation_policy": {"id": "PG2K3KC"},
+                "escalation_level": 1,
+                "end": None,
+            }],
+            "more": False,
+        }
+    if method == "POST" and path == "/incidents":
+        return 201, {"incident": {"id": f"QSTUB{next(_ids)}"}}
+    if method == "POST" and path.endswith("/notes"):
+        return 201, {"note": {"id": f"NSTUB{next(_ids)}"}}
+    if method == "GET" and path.startswith("/incidents/"):
+        return 200, {"incident": {"id": path.rsplit("/", 1)[1], "status": "triggered"}}
+    if method == "PUT" and path.startswith("/incidents/"):
+        return 200, {"incident": {"id": path.rsplit("/", 1)[1]}}
+    return 404, {"error": {"message": "Not Found"}}
+
+def _freshservice(method, path):
+    if method == "POST" and path == "/api/v2/tickets":
+        return 201, {"ticket": {"id": next(_ids), "status": 2}}
+    if method == "PUT" and path.startswith("/api/v2/tickets/"):
+        return 200, {"ticket": {"id": int(path.rsplit("/", 1)[1]), "status": 4}}
+    return 404, {"code": "not_found"}
+
+def _slack(method, path):
+    if path == "/api/users.list":
+        members = [{"id": "USTUB1", "profile": {"email": REPORTER_EMAIL}}]
+        return 200, {"ok": True, "members": members, "response_metadata": {"next_cursor": ""}}
+    if path == "/api/users.lookupByEmail":
+        return 200, {"ok": True, "user": {"id": "USTUB1"}}
+    if path == "/api/chat.postMessage":
+        _slack_posts.append(time.perf_counter())
+        return 200, {"ok": True, "ts": f"{time.time():.6f}"}
+    return 200, {"ok": False, "error": "unknown_method"}
+
+def _graph(method, path):
+    meeting_url = f"https://teams.example.com/l/meetup-join/{next(_ids)}"
+    return 201, {"joinUrl": meeting_url, "joinWebUrl": meeting_url}
+
+def _login(method, path):
+    return 200, {"access_token": "stub-token", "token_type": "Bearer", "expires_in": 3599}
+
+STUBS = {
+    "api.pagerduty.com": _pagerduty,
+    "aenetworks.freshservice.com": _freshservice,
+    "aenetworks-fs-sandbox.freshservice.com": _freshservice,
+    "slack.com": _slack,
+    "graph.microsoft.com": _graph,
+    "login.microsoftonline.com": _login,
+}
+
+class StubServer:
+    """A local stand-in for one vendor host with injected latency, errors and throttling."""
+
+    def __init__(self, route, latency, jitter, error_rate, throttle_rate, retry_after):
+        self.calls = 0
+        calls_lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def _respond(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with calls_lock:
+                    stub.calls += 1
+                time.sleep(latency + random.uniform(0, jitter))
+                headers = {}
+                roll = random.random()
+                if roll < throttle_rate:
+                    status, body = 429, {"error": "rate_limited"}
+                    headers["Retry-After"] = str(retry_after)
+                elif roll < throttle_rate + error_rate:
+                    status, body = 503, {"error": "service_unavailable"}
+                else:
+                    status, body = route(self.command, urlsplit(self.path).path)
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = do_PUT = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _configure_env(stubs, state_dir):
+    os.environ.update({
+        "PD_TOOLS_BASE_URL_OVERRIDES": json.dumps({host: stub.base_url for host, stub in stubs.items()}),
+        "PD_TOOLS_STATE_DIR": state_dir,
+        # Every run pages the same description; don't let page_dedup fold them into one incident.
+        "PD_PAGE_DEDUP_WINDOW_SECONDS": "0",
+        "PD_API_KEY": "stub",
+        "PD_SERVICE_ID": "PSTUBSV",
+        "PD_ESCALATION_POLICY_ID": "PSTUBEP",
+        "KUBIYA_USER_EMAIL": REPORTER_EMAIL,
+        "FSAPI_PROD": "stub",
+        "SLACK_API_TOKEN": "stub",
+        "AZURE_TENANT_ID": "stub-tenant",
+        "AZURE_CLIENT_ID": "stub-client",
+        "AZURE_CLIENT_SECRET": "stub",
+        "INCIDENT_RESPONSE_CHANNEL_ID": "CSTUB",
+        "INCIDENT_RESPONSE_CHANNEL_NAME": "incident_response",
+        "STANDING_BRIDGE_URL": "https://teams.example.com/l/standing-bridge",
+    })
+    os.environ.pop("FSAPI_SANDBOX", None)
+
+WORKFLOW_ARGS = {
+    "page_oncall_engineer": ["--description", "Checkout is failing for all users"],
+    "trigger_major_incident": ["--description", "Checkout is failing for all users", "--business_impact", "No orders can be placed"],
+    "webhook_incident_response": [
+        "--description", "Checkout is failing for all users",
+        "--servicename", "checkout-api",
+        "--title", "Checkout is failing",
+        "--incident_url", "https://aetnd.pagerduty.com/incidents/QSTUB",
+        "--slackincidentcommander", "Stub Engineer",
+        "--slackdetectionmethod", "PagerDuty",
+        "--slackbusinessimpact", "No orders can be placed",
+        "--bridge_url", "https://teams.example.com/l/standing-bridge",
+        "--reporter_email", REPORTER_EMAIL,
+    ],
+}
+
+def _percentile(cut_points, p):
+    return cut_points[p - 1] if cut_points else float("nan")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the incident workflows against local vendor stubs.")
+    parser.add_argument("--runs", type=int, default=30, help="Runs per workflow")
+    parser.add_argument("--workflows", default=",".join(WORKFLOW_ARGS), help="Comma-separated workflows to run")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Base latency of every stub response")
+    parser.add_argument("--jitter-ms", type=float, default=20, help="Extra random latency, up to this much")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After seconds sent with each 429")
+    parser.add_argument("--cold-state", action="store_true", help="Start every run with an empty state directory")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep http_client's per-host rate limits")
+    args = parser.parse_args()
+
+    stubs = {
+        host: StubServer(route, args.latency_ms / 1000, args.jitter_ms / 1000, args.error_rate, args.throttle_rate, args.retry_after)
+        for host, route in STUBS.items()
+    }
+    state_root = tempfile.mkdtemp(prefix="pd-tools-bench-")
+    _configure_env(stubs, state_root)
+
+    # The scripts read their configuration at import time, so import them only now.
+    sys.path.insert(0, TOOLS_DIR)
+    http_client = importlib.import_module("http_client")
+    rate_limit = importlib.import_module("rate_limit")
+    state_store = importlib.import_module("state_store")
+    if not args.keep_rate_limits:
+        rate_limit.HOST_LIMITS.clear()
+
+    print(f"{'workflow':28} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'announce p50':>13} {'calls/run':>10} {'failed':>7}")
+    try:
+        for name in args.workflows.split(","):
+            workflow = importlib.import_module(name)
+            timings, announce_timings, calls, failed = [], [], [], 0
+            for run in range(args.runs):
+                http_client._sessions.clear()
+                if args.cold_state:
+                    state_store.STATE_DIR = os.path.join(state_root, f"{name}-{run}")
+                before = sum(stub.calls for stub in stubs.values())
+                posts_before = len(_slack_posts)
+                sys.argv = [name] + WORKFLOW_ARGS[name]
+                if name == "trigger_major_incident":
+                    # Otherwise every run after the first resumes the first one's journal.
+                    sys.argv += ["--idempotency_key", uuid.uuid4().hex]
+                if name == "webhook_incident_response":
+                    # Otherwise delivery_dedup skips every run after the first as a redelivery.
+                    sys.argv += ["--incident_id", f"QSTUB{uuid.uuid4().hex[:8].upper()}"]
+                start = time.perf_counter()
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                        workflow.main()
+                except Exception as e:
+                    failed += 1
+                    print(f"{name} run {run} failed: {e}", file=sys.stderr)
+                timings.append((time.perf_counter() - start) * 1000)
+                if len(_slack_posts) > posts_before:
+                    announce_timings.append((_slack_posts[posts_before] - start) * 1000)
+                calls.append(sum(stub.calls for stub in stubs.values()) - before)
+            cut_points = statistics.quantiles(timings, n=100) if len(timings) > 1 else []
+            announce_p50 = statistics.median(announce_timings) if announce_timings else float("nan")
+            print(
+                f"{name:28} {_percentile(cut_points, 50):9.1f} {_percentile(cut_points, 95):9.1f} "
+                f"{_percentile(cut_points, 99):9.1f} {announce_p50:13.1f} {statistics.mean(calls):10.2f} {failed:7d}"
+            )
+    finally:
+        for stub in stubs.values():
+            stub.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+"""Fail when a PD tool's imports grow past their recorded share of startup.
+
+Builds the zipapp and runs each subcommand with --help under `python -X
+importtime`, the way a tool container runs it: stdlib HTTP transport, no
+bytecode cache. Its import time is the total of the top-level imports after
+interpreter startup (site). The loose scripts, as shipped before the bundle, are
+timed the same way for comparison.
+
+Absolute times depend on the host, so each subcommand is measured against
+fake_tool, which imports next to nothing, run alongside it on the same host:
+its cost is the median ratio of the two. import_budget.json records each
+subcommand's ratio, and a run fails when one exceeds it by more than
+--tolerance. After an intended change in imports, record the new ratios:
+
+    python gen3/pd_tools/benchmarks/check_import_budget.py --runs 5
+    python gen3/pd_tools/benchmarks/check_import_budget.py --runs 9 --record
+
+Run with the tool image's Python (3.11) so the bundled bytecode is used.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+TOOLS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tools", "pager_duty_incident")
+sys.path.insert(0, TOOLS_DIR)
+
+import bundle
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "import_budget.json")
+BASELINE_SUBCOMMAND = "fake_tool"
+
+def _import_ms(command, state_dir):
+    env = dict(os.environ, PD_TOOLS_HTTP_TRANSPORT="stdlib", PD_TOOLS_STATE_DIR=state_dir, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + command + ["--help"],
+        env=env, cwd=state_dir, capture_output=True, text=True,
+    )
+    total_us, after_site = 0, False
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if name.strip() == "site" and not name.startswith("  "):
+            after_site = True
+        elif after_site and cumulative.strip().isdigit() and name[1:2] != " ":
+            total_us += int(cumulative)
+    if not after_site:
+        raise Exception(f"{' '.join(command)} printed no import times: {result.stderr[-500:]}")
+    return total_us / 1000
+
+def _loose_copy(subcommand, run_dir):
+    # A fresh copy of every module, as the tool containers get in /tmp, so none has cached bytecode.
+    for module in bundle.modules():
+        shutil.copy(os.path.join(TOOLS_DIR, f"{module}.py"), run_dir)
+    return os.path.join(run_dir, f"{subcommand}.py")
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the PD tools' import time against their recorded baselines.")
+    parser.add_argument("--runs", type=int, default=5, help="Runs per subcommand")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="How far over its recorded ratio to fake_tool a subcommand may go, as a fraction")
+    parser.add_argument("--record", action="store_true", help=f"Write the measured ratios to {os.path.basename(BASELINE_PATH)} instead of checking them")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="pd-tools-importtime-")
+    bundle_path = os.path.join(work_dir, "pdtools.pyz")
+    with open(bundle_path, "wb") as f:
+        f.write(bundle.build())
+
+    def bundled_ms(subcommand):
+        return _import_ms([bundle_path, subcommand], tempfile.mkdtemp(dir=work_dir))
+
+    baselines = {}
+    if not args.record:
+        with open(BASELINE_PATH) as f:
+            baselines = json.load(f)
+
+    ratios, over = {}, []
+    print(f"{'subcommand':28} {'loose ms':>9} {'bundle ms':>10} {'ratio':>6}" + ("" if args.record else f" {'budget':>7}"))
+    for subcommand in bundle.SUBCOMMANDS:
+        if subcommand == BASELINE_SUBCOMMAND:
+            continue
+        loose = statistics.median(
+            _import_ms([_loose_copy(subcommand, run_dir)], run_dir)
+            for run_dir in (tempfile.mkdtemp(dir=work_dir) for _ in range(args.runs))
+        )
+        # Each sample is paired with a baseline one, so load on the host shifts both alike.
+        samples = [(bundled_ms(subcommand), bundled_ms(BASELINE_SUBCOMMAND)) for _ in range(args.runs)]
+        bundled = statistics.median(ms for ms, _ in samples)
+        ratios[subcommand] = round(statistics.median(ms / baseline_ms for ms, baseline_ms in samples), 2)
+        if args.record:
+            print(f"{subcommand:28} {loose:9.1f} {bundled:10.1f} {ratios[subcommand]:6.2f}")
+            continue
+        budget = baselines[subcommand] * (1 + args.tolerance)
+        print(f"{subcommand:28} {loose:9.1f} {bundled:10.1f} {ratios[subcommand]:6.2f} {budget:7.2f}")
+        if ratios[subcommand] > budget:
+            over.append(subcommand)
+
+    if args.record:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(ratios, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Recorded import ratios to {BASELINE_SUBCOMMAND} in {BASELINE_PATH}")
+    elif over:
+        print(f"Over their recorded import budget: {', '.join(over)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
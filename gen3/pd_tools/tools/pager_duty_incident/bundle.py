@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+
+"""Package the PD tool scripts as one zipapp: python pdtools.pyz <subcommand> [args].
+
+Each module goes in as source plus unchecked-hash bytecode, so a container imports
+them without compiling anything. zipimport falls back to the source when the bytecode
+is for another Python version, so the bundle is built with the tool image's Python
+(3.11). Loading tool-def.py builds it whenever it is missing or older than the
+sources, running this script under python3.11 if the registry runs another Python.
+To build it ahead of time, as part of deploying the registry:
+
+    python3.11 gen3/pd_tools/tools/pager_duty_incident/bundle.py
+"""
+
+import os
+import sys
+from pathlib import Path
+
+TOOL_DIR = Path(__file__).parent
+# The tool image's Python; its bytecode is the only kind the containers can use.
+TARGET_VERSION = (3, 11)
+ARTIFACT = TOOL_DIR / "pdtools.pyz"
+# The Python version and the sources' sizes and mtimes the artifact was built from.
+ARTIFACT_STAMP = TOOL_DIR / "pdtools.pyz.stamp"
+
+# The scripts a tool runs, by subcommand; every other module is shared code.
+SUBCOMMANDS = (
+    "fake_tool",
+    "page_oncall_engineer",
+    "sandbox_cleanup",
+    "trigger_major_incident",
+    "webhook_incident_response",
+    "webhook_server",
+)
+
+_NOT_BUNDLED = {"__init__", "bundle", "tool-def"}
+
+# A fixed timestamp keeps the archive byte-identical across builds of the same sources.
+_ZIP_DATE_TIME = (2020, 1, 1, 0, 0, 0)
+
+_MAIN = '''import importlib
+import sys
+
+SUBCOMMANDS = %r
+
+if len(sys.argv) < 2 or sys.argv[1] not in SUBCOMMANDS:
+    print(f"usage: {sys.argv[0]} {{{','.join(SUBCOMMANDS)}}} [args]", file=sys.stderr)
+    sys.exit(2)
+name = sys.argv.pop(1)
+sys.argv[0] = name
+importlib.import_module(name).main()
+''' % (SUBCOMMANDS,)
+
+def modules():
+    return sorted(path.stem for path in TOOL_DIR.glob("*.py") if path.stem not in _NOT_BUNDLED)
+
+def sources_stamp(version=TARGET_VERSION):
+    """Identifies the bundle the current sources would build, from a stat of each rather than its contents."""
+    lines = ["python " + ".".join(map(str, version))]
+    for module in modules():
+        stat = (TOOL_DIR / f"{module}.py").stat()
+        lines.append(f"{module} {stat.st_size} {stat.st_mtime_ns}")
+    return "\n".join(lines) + "\n"
+
+def _bytecode(module, tmp_dir):
+    import py_compile
+    cfile = os.path.join(tmp_dir, f"{module}.pyc")
+    py_compile.compile(
+        str(TOOL_DIR / f"{module}.py"),
+        cfile=cfile,
+        dfile=f"pdtools.pyz/{module}.py",
+        doraise=True,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    with open(cfile, "rb") as f:
+        return f.read()
+
+def build():
+    """The zipapp's bytes."""
+    # Only the build step pays for these; tool-def imports this module just to find the artifact.
+    import io
+    import tempfile
+    import zipfile
+
+    buffer = io.BytesIO()
+    with tempfile.TemporaryDirectory() as tmp_dir, zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        def add(name, data):
+            info = zipfile.ZipInfo(name, date_time=_ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, data)
+
+        add("__main__.py", _MAIN)
+        for module in modules():
+            add(f"{module}.py", (TOOL_DIR / f"{module}.py").read_bytes())
+            add(f"{module}.pyc", _bytecode(module, tmp_dir))
+    return buffer.getvalue()
+
+def write_artifact(output=ARTIFACT):
+    data = build()
+    with open(output, "wb") as f:
+        f.write(data)
+    if Path(output).resolve() == ARTIFACT.resolve():
+        ARTIFACT_STAMP.write_text(sources_stamp(sys.version_info[:2]))
+    return data
+
+def _build_with_target_python():
+    import shutil
+    import subprocess
+
+    python = shutil.which("python" + ".".join(map(str, TARGET_VERSION)))
+    if python and subprocess.run([python, __file__], stdout=subprocess.DEVNULL).returncode == 0:
+        return ARTIFACT.read_bytes()
+    return None
+
+def read_artifact():
+    """The zipapp's bytes, rebuilding the artifact first if it is missing or stale.
+
+    Without the tool image's Python at hand, the bundle is built with this one: it still
+    runs, from source.
+    """
+    try:
+        if ARTIFACT_STAMP.read_text() == sources_stamp():
+            return ARTIFACT.read_bytes()
+    except FileNotFoundError:
+        pass
+    if sys.version_info[:2] != TARGET_VERSION:
+        data = _build_with_target_python()
+        if data is not None:
+            return data
+        print(f"Warning: no python{'.'.join(map(str, TARGET_VERSION))} to build {ARTIFACT.name} with; its bytecode won't be used", file=sys.stderr)
+    try:
+        return write_artifact()
+    except OSError:
+        # A read-only checkout still gets the bundle, just not a cached one.
+        return build()
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the PD tools zipapp.")
+    parser.add_argument("--output", default=str(ARTIFACT), help="Where to write the bundle")
+    args = parser.parse_args()
+
+    if sys.version_info[:2] != TARGET_VERSION:
+        sys.exit(f"Build the bundle with Python {'.'.join(map(str, TARGET_VERSION))}, the tool image's, not {sys.version.split()[0]}: its bytecode would be ignored")
+    data = write_artifact(args.output)
+    print(f"Wrote {args.output}: {len(modules())} modules, {len(data)} bytes")
+
+if __name__ == "__main__":
+    main()
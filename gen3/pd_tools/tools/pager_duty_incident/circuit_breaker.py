@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import contextvars
+import math
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# The last WINDOW_SIZE outcomes of each endpoint are kept in the shared state directory,
+# so a breaker opened by one run is seen by the next. Once at least MIN_SAMPLES calls are
+# in the window and FAILURE_RATE_THRESHOLD of them failed, a failure opens the breaker
+# for OPEN_SECONDS; after that calls go through again and the next failure reopens it.
+WINDOW_SIZE = 20
+MIN_SAMPLES = 5
+FAILURE_RATE_THRESHOLD = 0.5
+OPEN_SECONDS = 60
+# Hedge delay used until an endpoint has MIN_SAMPLES successful calls on record.
+DEFAULT_HEDGE_SECONDS = 2.0
+MIN_HEDGE_SECONDS = 0.2
+
+def _store_name(endpoint):
+    return f"circuit-{endpoint}"
+
+def is_open(endpoint):
+    state = state_store.read_json(_store_name(endpoint), {})
+    return state.get("opened_at", 0) + OPEN_SECONDS > time.time()
+
+def record(endpoint, latency, ok):
+    with state_store.locked_json(_store_name(endpoint)) as state:
+        samples = (state.get("samples", []) + [[latency, ok]])[-WINDOW_SIZE:]
+        state["samples"] = samples
+        failures = sum(1 for _, sample_ok in samples if not sample_ok)
+        if not ok and len(samples) >= MIN_SAMPLES and failures / len(samples) >= FAILURE_RATE_THRESHOLD:
+            state["opened_at"] = time.time()
+
+def hedge_delay(endpoint):
+    """The p95 latency of `endpoint`'s recent successful calls."""
+    samples = state_store.read_json(_store_name(endpoint), {}).get("samples", [])
+    latencies = sorted(latency for latency, ok in samples if ok)
+    if len(latencies) < MIN_SAMPLES:
+        return DEFAULT_HEDGE_SECONDS
+    return max(MIN_HEDGE_SECONDS, latencies[math.ceil(0.95 * len(latencies)) - 1])
+
+def call(endpoint, func, hedge=True):
+    """Call `func()` through `endpoint`'s breaker and return the first successful result.
+
+    Raises without calling `func` while the breaker is open. With `hedge`, a second
+    attempt is started if the first is still running after the endpoint's p95
+    latency, and whichever succeeds first wins, so `func` must be safe to run twice.
+    """
+    if is_open(endpoint):
+        raise Exception(f"Circuit breaker for {endpoint} is open")
+
+    def attempt():
+        start = time.monotonic()
+        try:
+            result = func()
+        except Exception:
+            record(endpoint, time.monotonic() - start, False)
+            raise
+        record(endpoint, time.monotonic() - start, True)
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        pending = {executor.submit(contextvars.copy_context().run, attempt)}
+        done, _ = wait(pending, timeout=hedge_delay(endpoint) if hedge else None)
+        if not done:
+            print(f"{endpoint} is slower than its p95, sending a hedged request")
+            pending.add(executor.submit(contextvars.copy_context().run, attempt))
+
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    return future.result()
+                except Exception as e:
+                    error = e
+        raise error
+    finally:
+        # Don't wait for the losing attempt; it is bounded by the http_client deadline.
+        executor.shutdown(wait=False)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+# The current run's deadline, shared by http_client (request timeouts, rate-limit waits)
+# and state_store (lock waits). http_client re-exports these.
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline(seconds):
+    """Bound every request made in this context (and in steps it starts) to `seconds` from now.
+
+    Nested deadlines can only tighten the enclosing one.
+    """
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+@contextmanager
+def reserve(seconds):
+    """Hold back `seconds` of the current deadline for work that has to happen afterwards."""
+    current = _deadline.get()
+    if current is None:
+        yield
+        return
+    token = _deadline.set(current - seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining():
+    """Seconds left before the current deadline, or None outside of one."""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+MAX_ATTEMPTS = 5
+RETRY_BACKOFF_SECONDS = 60
+# A claimed action that is neither completed nor released within this window (the worker
+# died mid-batch) becomes due again.
+LEASE_SECONDS = 300
+
+_QUEUE_NAME = "deferred-actions"
+
+def schedule(action, args, delay_seconds):
+    """Durably record `action(*args)` to be run by a worker `delay_seconds` from now."""
+    with state_store.locked_json(_QUEUE_NAME, list) as queue:
+        queue.append({
+            "id": os.urandom(16).hex(),
+            "action": action,
+            "args": list(args),
+            "due_at": time.time() + delay_seconds,
+            "attempts": 0,
+            "leased_until": 0,
+        })
+
+def _claim_due(limit):
+    now = time.time()
+    claimed = []
+    with state_store.locked_json(_QUEUE_NAME, list) as queue:
+        for item in queue:
+            if len(claimed) >= limit:
+                break
+            if item["due_at"] <= now and item["leased_until"] <= now:
+                item["leased_until"] = now + LEASE_SECONDS
+                claimed.append(dict(item))
+    return claimed
+
+def _settle(succeeded, failed):
+    now = time.time()
+    with state_store.locked_json(_QUEUE_NAME, list) as queue:
+        remaining = []
+        for item in queue:
+            if item["id"] in succeeded:
+                continue
+            if item["id"] in failed:
+                item["attempts"] += 1
+                item["leased_until"] = 0
+                item["due_at"] = now + RETRY_BACKOFF_SECONDS * 2 ** (item["attempts"] - 1)
+                if item["attempts"] >= MAX_ATTEMPTS:
+                    print(f"Giving up on {item['action']}{tuple(item['args'])} after {item['attempts']} attempts")
+                    continue
+            remaining.append(item)
+        queue[:] = remaining
+
+def pending():
+    return state_store.read_json(_QUEUE_NAME, [])
+
+def run_due(handlers, batch_size=50, max_workers=8):
+    """Run up to `batch_size` due actions concurrently; returns (succeeded, failed) counts.
+
+    `handlers` maps action names to callables. Failed actions are retried with
+    exponential backoff up to MAX_ATTEMPTS times.
+    """
+    batch = _claim_due(batch_size)
+    if not batch:
+        return 0, 0
+
+    def run(item):
+        try:
+            handlers[item["action"]](*item["args"])
+            return item["id"], None
+        except Exception as e:
+            return item["id"], e
+
+    succeeded, failed = set(), set()
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batch))) as executor:
+        for item, (item_id, error) in zip(batch, executor.map(run, batch)):
+            if error is None:
+                succeeded.add(item_id)
+            else:
+                print(f"{item['action']}{tuple(item['args'])} failed: {error}")
+                failed.add(item_id)
+    _settle(succeeded, failed)
+    return len(succeeded), len(failed)
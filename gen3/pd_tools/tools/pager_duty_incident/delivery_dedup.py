@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import random
+import time
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# Each processed key is an empty marker file, so checking and claiming one is a single
+# exclusive create however many are stored. Markers older than the TTL no longer count
+# and are swept away, along with the oldest ones beyond MAX_ENTRIES.
+DEDUP_TTL_SECONDS = int(os.getenv("PD_WEBHOOK_DEDUP_TTL_SECONDS", 86400))
+MAX_ENTRIES = int(os.getenv("PD_WEBHOOK_DEDUP_MAX_ENTRIES", 10000))
+# Claims between sweeps, on average.
+SWEEP_EVERY = 100
+
+_DIR_NAME = "webhook-deliveries"
+
+def _marker_path(key):
+    directory = state_store.state_path(_DIR_NAME, "")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    return os.path.join(directory, hashlib.sha256(key.encode("utf-8")).hexdigest()[:32])
+
+def claim(key):
+    """Record `key` as processed. Returns False if it already was within the TTL."""
+    path = _marker_path(key)
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+    except FileExistsError:
+        with state_store.file_lock(_DIR_NAME):
+            try:
+                if os.path.getmtime(path) + DEDUP_TTL_SECONDS > time.time():
+                    return False
+                os.utime(path)
+            except FileNotFoundError:
+                # Swept in the meantime; claim it afresh.
+                os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+    if random.random() < 1 / SWEEP_EVERY:
+        sweep()
+    return True
+
+def release(key):
+    """Forget `key`, so that a redelivery is processed again."""
+    try:
+        os.remove(_marker_path(key))
+    except FileNotFoundError:
+        pass
+
+def sweep():
+    directory = state_store.state_path(_DIR_NAME, "")
+    with state_store.file_lock(_DIR_NAME):
+        cutoff = time.time() - DEDUP_TTL_SECONDS
+        markers = []
+        for entry in os.scandir(directory):
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            if mtime <= cutoff:
+                os.remove(entry.path)
+            else:
+                markers.append((mtime, entry.path))
+        markers.sort()
+        for _, path in markers[:max(0, len(markers) - MAX_ENTRIES)]:
+            os.remove(path)
@@ -1,3 +1,21 @@
 #!/usr/bin/env python3
 
-print("Hello, world!")
\ No newline at end of file
+# A no-op tool: its startup report is the docker tool runtime's own overhead, to compare
+# with the "startup" section of the real tools' traces.
+
+import json
+import time
+
+try:
+    from . import startup_probe
+except ImportError:
+    import startup_probe
+
+IMPORTS_DONE_NS = time.time_ns()
+
+def main():
+    print("Hello, world!")
+    print(json.dumps({"tool": "fake-tool", **startup_probe.report(IMPORTS_DONE_NS, time.time_ns())}))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+
+import base64
+import json
+import os
+import threading
+import time
+from json import dumps as _json_dumps
+from urllib.parse import urlencode, urlsplit
+
+# "requests" uses requests.Session pools; "stdlib" uses http.client and needs no
+# third-party packages, so the tool containers can start without a pip install.
+# Unset picks requests when it is installed and falls back to the stdlib.
+TRANSPORT = os.getenv("PD_TOOLS_HTTP_TRANSPORT", "")
+if TRANSPORT != "stdlib":
+    try:
+        import requests
+        from requests.adapters import HTTPAdapter
+        TRANSPORT = "requests"
+    except ImportError:
+        if TRANSPORT == "requests":
+            raise
+        TRANSPORT = "stdlib"
+
+if TRANSPORT == "requests":
+    RequestException = requests.exceptions.RequestException
+    HTTPError = requests.exceptions.HTTPError
+    Timeout = requests.exceptions.Timeout
+else:
+    class RequestException(IOError):
+        def __init__(self, *args, response=None):
+            super().__init__(*args)
+            self.response = response
+
+    class HTTPError(RequestException):
+        pass
+
+    class Timeout(RequestException):
+        pass
+
+class DeadlineExceeded(Timeout):
+    pass
+
+try:
+    from . import metrics, rate_limit, tracing
+    from .deadlines import deadline, remaining, reserve
+except ImportError:
+    import metrics
+    import rate_limit
+    import tracing
+    from deadlines import deadline, remaining, reserve
+
+# Enough keep-alive connections per host for every concurrent step of a workflow.
+POOL_MAXSIZE = 16
+
+MAX_RETRIES = 4
+
+# Per-call (connect, read) timeouts; inside a deadline() they shrink to the time left.
+CONNECT_TIMEOUT_SECONDS = 3.05
+READ_TIMEOUT_SECONDS = 10.0
+# 429 means the vendor rejected the request unprocessed, so it is safe to retry for any
+# method; transient 5xx responses are retried only for methods that are idempotent.
+_RETRY_ALWAYS = {429}
+_RETRY_IDEMPOTENT = {502, 503, 504}
+_IDEMPOTENT_METHODS = {"GET", "PUT", "DELETE", "HEAD", "OPTIONS"}
+
+# Sends a vendor host's requests to another base URL instead, e.g. local stub servers:
+# PD_TOOLS_BASE_URL_OVERRIDES='{"api.pagerduty.com": "http://127.0.0.1:9001"}'.
+# Credentials and rate limits still follow the original host.
+BASE_URL_OVERRIDES = json.loads(os.getenv("PD_TOOLS_BASE_URL_OVERRIDES") or "{}")
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+def _get_or_raise_env_var(env_var):
+    value = os.getenv(env_var)
+    if value is None:
+        raise Exception(f"Env var {env_var} is not set")
+    return value
+
+def _pagerduty_defaults(session):
+    session.headers["Authorization"] = f"Token token={_get_or_raise_env_var('PD_API_KEY')}"
+    session.headers["Accept"] = "application/vnd.pagerduty+json;version=2"
+    session.headers["From"] = _get_or_raise_env_var("KUBIYA_USER_EMAIL")
+
+def _slack_defaults(session):
+    session.headers["Authorization"] = f"Bearer {_get_or_raise_env_var('SLACK_API_TOKEN')}"
+
+def _freshservice_defaults(api_key_env_var):
+    def apply(session):
+        session.auth = (_get_or_raise_env_var(api_key_env_var), "X")
+    return apply
+
+# Credentials are attached once per host session rather than on every call.
+_HOST_DEFAULTS = {
+    "api.pagerduty.com": _pagerduty_defaults,
+    "slack.com": _slack_defaults,
+    "aenetworks.freshservice.com": _freshservice_defaults("FSAPI_PROD"),
+    "aenetworks-fs-sandbox.freshservice.com": _freshservice_defaults("FSAPI_SANDBOX"),
+}
+
+class _StdlibResponse:
+    """The subset of requests.Response the tool scripts rely on."""
+
+    def __init__(self, url, status_code, reason, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    @property
+    def text(self):
+        return self.content.decode("utf-8", errors="replace")
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if 400 <= self.status_code < 500:
+            kind = "Client Error"
+        elif 500 <= self.status_code < 600:
+            kind = "Server Error"
+        else:
+            return
+        raise HTTPError(f"{self.status_code} {kind}: {self.reason} for url: {self.url}", response=self)
+
+class _StdlibSession:
+    """Keep-alive http.client connections for a single host, shaped like requests.Session."""
+
+    def __init__(self):
+        self.headers = {"User-Agent": "pd-tools", "Accept": "*/*"}
+        self.auth = None
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _ssl_context(self, verify):
+        import ssl
+        if verify is False:
+            return ssl._create_unverified_context()
+        if isinstance(verify, str):
+            return ssl.create_default_context(cafile=verify)
+        return ssl.create_default_context()
+
+    def _checkout(self, scheme, netloc, timeout, verify):
+        import http.client
+        key = (scheme, netloc, verify if isinstance(verify, str) else bool(verify is not False))
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if idle:
+                return key, idle.pop(), True
+        if scheme == "https":
+            connection = http.client.HTTPSConnection(netloc, timeout=timeout, context=self._ssl_context(verify))
+        else:
+            connection = http.client.HTTPConnection(netloc, timeout=timeout)
+        return key, connection, False
+
+    def _checkin(self, key, connection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < POOL_MAXSIZE:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def request(self, method, url, params=None, data=None, json=None, headers=None, auth=None, timeout=None, verify=True):
+        # ssl and http.client are a third of this module's import time; a run that
+        # never makes a request (a duplicate delivery, a resumed journal) skips them.
+        import http.client
+        parts = urlsplit(url)
+        path = parts.path or "/"
+        query = parts.query
+        if params:
+            query = f"{query}&{urlencode(params, doseq=True)}" if query else urlencode(params, doseq=True)
+        if query:
+            path = f"{path}?{query}"
+
+        request_headers = dict(self.headers)
+        body = None
+        if json is not None:
+            body = _json_dumps(json).encode("utf-8")
+            request_headers["Content-Type"] = "application/json"
+        elif isinstance(data, dict):
+            body = urlencode(data, doseq=True).encode("utf-8")
+            request_headers["Content-Type"] = "application/x-www-form-urlencoded"
+        elif data is not None:
+            body = data.encode("utf-8") if isinstance(data, str) else data
+        auth = auth or self.auth
+        if auth:
+            credentials = base64.b64encode(f"{auth[0]}:{auth[1]}".encode("utf-8")).decode("ascii")
+            request_headers["Authorization"] = f"Basic {credentials}"
+        request_headers.update(headers or {})
+        if isinstance(timeout, tuple):
+            timeout = max(timeout)
+
+        while True:
+            key, connection, reused = self._checkout(parts.scheme, parts.netloc, timeout, verify)
+            if reused and connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            try:
+                connection.request(method, path, body=body, headers=request_headers)
+                response = connection.getresponse()
+                content = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                connection.close()
+                # The server may drop an idle keep-alive connection at any time; retry
+                # those on a fresh connection, but never a failure on a new one.
+                if reused:
+                    continue
+                raise RequestException(f"Connection to {parts.netloc} failed: {e}") from e
+            except TimeoutError as e:
+                connection.close()
+                raise Timeout(f"Request to {parts.netloc} timed out: {e}") from e
+            except (OSError, http.client.HTTPException) as e:
+                connection.close()
+                raise RequestException(f"Request to {parts.netloc} failed: {e}") from e
+            break
+
+        if response.will_close:
+            connection.close()
+        else:
+            self._checkin(key, connection)
+        return _StdlibResponse(url, response.status, response.reason, response.headers, content)
+
+def _new_session(host):
+    if TRANSPORT == "requests":
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+    else:
+        session = _StdlibSession()
+    apply_defaults = _HOST_DEFAULTS.get(host)
+    if apply_defaults:
+        apply_defaults(session)
+    return session
+
+def session_for(url):
+    """Return the pooled session for the host of `url`, creating it on first use."""
+    host = urlsplit(url).hostname
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = _sessions[host] = _new_session(host)
+        return session
+
+def _timeouts(url):
+    left = remaining()
+    if left is None:
+        return (CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+    if left <= 0:
+        raise DeadlineExceeded(f"Deadline exceeded before request to {url}")
+    return (min(CONNECT_TIMEOUT_SECONDS, left), min(READ_TIMEOUT_SECONDS, left))
+
+def _target(url):
+    parts = urlsplit(url)
+    base_url = BASE_URL_OVERRIDES.get(parts.hostname)
+    if not base_url:
+        return url
+    return base_url.rstrip("/") + url[len(f"{parts.scheme}://{parts.netloc}"):]
+
+def _should_retry(method, status_code):
+    return status_code in _RETRY_ALWAYS or (method in _IDEMPOTENT_METHODS and status_code in _RETRY_IDEMPOTENT)
+
+def request(method, url, max_retries=MAX_RETRIES, **kwargs):
+    """Send a request through the host's pooled session under its shared rate limit.
+
+    Throttled (429) and, for idempotent methods, transient 5xx responses are
+    retried up to `max_retries` times after the delay the vendor asks for, as
+    long as the current deadline leaves room for it. Unless the caller passes
+    `timeout`, each attempt gets connect/read timeouts from the deadline.
+    Every attempt is counted in the exported metrics.
+    """
+    parts = urlsplit(url)
+    host = parts.hostname
+    session = session_for(url)
+    target = _target(url)
+    explicit_timeout = kwargs.pop("timeout", None)
+    with tracing.span(f"HTTP {method}", host=host, endpoint=parts.path) as span:
+        attempt = 0
+        while True:
+            span["retries"] = attempt
+            timeout = explicit_timeout or _timeouts(url)
+            if not rate_limit.acquire(host, max_wait=remaining()):
+                raise DeadlineExceeded(f"Deadline exceeded waiting for the {host} rate limit")
+            started = time.perf_counter()
+            try:
+                response = session.request(method, target, timeout=timeout, **kwargs)
+            except Exception:
+                metrics.observe(host, method, parts.path, "error", 1 if attempt else 0, time.perf_counter() - started)
+                raise
+            metrics.observe(host, method, parts.path, response.status_code, 1 if attempt else 0, time.perf_counter() - started)
+            span["status"] = response.status_code
+            span["bytes"] = len(response.content)
+            rate_limit.observe(host, response.headers)
+            if attempt >= max_retries or not _should_retry(method, response.status_code):
+                return response
+            delay = rate_limit.retry_delay(response.headers, attempt)
+            if response.status_code == 429:
+                rate_limit.block_until(host, time.time() + delay)
+            left = remaining()
+            if left is not None and delay >= left:
+                return response
+            time.sleep(delay)
+            attempt += 1
+
+def get(url, **kwargs):
+    return request("GET", url, **kwargs)
+
+def post(url, **kwargs):
+    return request("POST", url, **kwargs)
+
+def put(url, **kwargs):
+    return request("PUT", url, **kwargs)
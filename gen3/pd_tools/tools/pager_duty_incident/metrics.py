@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import atexit
+import os
+import re
+import sys
+import tempfile
+import threading
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# Prometheus textfile-collector output. Every run folds its calls into running totals kept
+# in STATE_DIR and rewrites this file from them, so point node_exporter's
+# --collector.textfile.directory at its directory. Defaults to pd_tools.prom in STATE_DIR.
+TEXTFILE = os.getenv("PD_TOOLS_METRICS_TEXTFILE")
+
+# Upper bounds, in seconds, of the latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_STORE_NAME = "metrics"
+# Numeric (Freshservice), GUID (Graph users, Azure tenants), email and PagerDuty-style IDs.
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}(-[0-9a-fA-F]{4}){3}-[0-9a-fA-F]{12}|[^@]+@[^@]+|[A-Z0-9]{6,})$")
+
+_pending = {}
+_pending_lock = threading.Lock()
+
+def endpoint_label(path):
+    """`path` with its IDs replaced by "{id}", to keep label cardinality bounded."""
+    return "/".join("{id}" if _ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+def observe(host, method, endpoint, code, retries, seconds):
+    """Count one external call attempt. `code` is the response status, or "error" if none came back."""
+    key = "\t".join((host, method, endpoint_label(endpoint)))
+    with _pending_lock:
+        series = _pending.setdefault(key, {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0, "codes": {}, "retries": 0})
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                series["buckets"][i] += 1
+        series["count"] += 1
+        series["sum"] += seconds
+        series["codes"][str(code)] = series["codes"].get(str(code), 0) + 1
+        series["retries"] += retries
+
+def flush():
+    """Fold the calls observed since the last flush into the running totals and rewrite the textfile."""
+    global _pending
+    with _pending_lock:
+        pending, _pending = _pending, {}
+    if not pending:
+        return
+    try:
+        with state_store.locked_json(_STORE_NAME) as totals:
+            for key, series in pending.items():
+                total = totals.setdefault(key, {"buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0, "codes": {}, "retries": 0})
+                total["buckets"] = [a + b for a, b in zip(total["buckets"], series["buckets"])]
+                total["count"] += series["count"]
+                total["sum"] += series["sum"]
+                for code, count in series["codes"].items():
+                    total["codes"][code] = total["codes"].get(code, 0) + count
+                total["retries"] += series["retries"]
+            _write_textfile(_render(totals))
+    except OSError as e:
+        print(f"Failed to write metrics: {e}", file=sys.stderr)
+
+def _labels(key, **extra):
+    host, method, endpoint = key.split("\t")
+    labels = {"host": host, "method": method, "endpoint": endpoint, **extra}
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+def _render(totals):
+    lines = [
+        "# HELP pd_tools_http_request_duration_seconds Latency of each attempt at an external call.",
+        "# TYPE pd_tools_http_request_duration_seconds histogram",
+    ]
+    for key, total in sorted(totals.items()):
+        for bound, count in zip(LATENCY_BUCKETS, total["buckets"]):
+            lines.append(f"pd_tools_http_request_duration_seconds_bucket{{{_labels(key, le=bound)}}} {count}")
+        lines.append(f'pd_tools_http_request_duration_seconds_bucket{{{_labels(key, le="+Inf")}}} {total["count"]}')
+        lines.append(f"pd_tools_http_request_duration_seconds_sum{{{_labels(key)}}} {total['sum']}")
+        lines.append(f"pd_tools_http_request_duration_seconds_count{{{_labels(key)}}} {total['count']}")
+    lines += [
+        "# HELP pd_tools_http_responses_total External call attempts by response status; code=\"error\" means no response.",
+        "# TYPE pd_tools_http_responses_total counter",
+    ]
+    for key, total in sorted(totals.items()):
+        for code, count in sorted(total["codes"].items()):
+            lines.append(f"pd_tools_http_responses_total{{{_labels(key, code=code)}}} {count}")
+    lines += [
+        "# HELP pd_tools_http_retries_total Retries of external calls after throttling or transient errors.",
+        "# TYPE pd_tools_http_retries_total counter",
+    ]
+    for key, total in sorted(totals.items()):
+        lines.append(f"pd_tools_http_retries_total{{{_labels(key)}}} {total['retries']}")
+    return "\n".join(lines) + "\n"
+
+def _write_textfile(content):
+    # Written to a temp name the collector ignores, then renamed over the file, so a scrape
+    # never sees a partial file.
+    path = TEXTFILE or state_store.state_path("pd_tools", ".prom")
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix=".pd_tools.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(content)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+atexit.register(flush)
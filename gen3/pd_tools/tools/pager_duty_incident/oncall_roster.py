@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from datetime import datetime
+
+try:
+    from . import http_client, state_store
+except ImportError:
+    import http_client
+    import state_store
+
+# Upper bound on how long a policy's roster is trusted. Covers shifts without an end
+# and policies with nobody on call, which would otherwise never expire.
+MAX_TTL_SECONDS = 3600
+# The full roster is swept in the background (webhook_server, or this module run on a
+# schedule) this often; a lookup that misses fetches only its own policy.
+REFRESH_INTERVAL_SECONDS = int(os.getenv("ONCALL_ROSTER_REFRESH_SECONDS", 600))
+PAGE_SIZE = 100
+
+_ROSTER_NAME = "oncall-roster"
+
+def _fetch_oncalls(escalation_policy_id=None):
+    oncalls = []
+    offset = 0
+    while True:
+        params = {"limit": PAGE_SIZE, "offset": offset, "earliest": "true"}
+        if escalation_policy_id:
+            params["escalation_policy_ids[]"] = escalation_policy_id
+        response = http_client.get("https://api.pagerduty.com/oncalls", params=params)
+        response.raise_for_status()
+        data = response.json()
+        oncalls.extend(data.get("oncalls", []))
+        if not data.get("more"):
+            return oncalls
+        offset += PAGE_SIZE
+
+def _shift_end(oncall, default):
+    end = oncall.get("end")
+    if not end:
+        return default
+    return min(datetime.fromisoformat(end.replace("Z", "+00:00")).timestamp(), default)
+
+def _build_roster(oncalls, now):
+    """Index on-calls as {policy_id: {"expires_at": ..., "levels": {level: [entry, ...]}}}."""
+    max_expiry = now + MAX_TTL_SECONDS
+    policies = {}
+    for oncall in oncalls:
+        user = oncall.get("user")
+        policy = oncall.get("escalation_policy")
+        if not user or not policy:
+            continue
+        end = _shift_end(oncall, max_expiry)
+        roster = policies.setdefault(policy["id"], {"expires_at": max_expiry, "levels": {}})
+        roster["expires_at"] = min(roster["expires_at"], end)
+        roster["levels"].setdefault(str(oncall.get("escalation_level", 1)), []).append(
+            {"user_id": user.get("id"), "summary": user.get("summary"), "end": end}
+        )
+    return {"fetched_at": now, "expires_at": max_expiry, "policies": policies}
+
+def _current(roster, escalation_policy_id, now):
+    if not roster:
+        return False
+    policy = roster["policies"].get(escalation_policy_id)
+    expires_at = policy["expires_at"] if policy else roster["expires_at"]
+    return expires_at > now
+
+def refresh_due():
+    """Whether the last full sweep is older than REFRESH_INTERVAL_SECONDS."""
+    roster = state_store.read_json(_ROSTER_NAME)
+    return not roster or roster.get("fetched_at", 0) + REFRESH_INTERVAL_SECONDS <= time.time()
+
+def refresh_roster():
+    """Prefetch every policy's on-calls in one paginated sweep."""
+    roster = _build_roster(_fetch_oncalls(), time.time())
+    with state_store.file_lock(_ROSTER_NAME):
+        state_store.write_json(_ROSTER_NAME, roster)
+    return roster
+
+def refresh_policy(escalation_policy_id):
+    """Fetch one policy's on-calls and merge them into the roster, unless another caller just did."""
+    with state_store.file_lock(_ROSTER_NAME):
+        now = time.time()
+        # Policies absent from a partial fetch say nothing about who is on call, so a roster
+        # built from them answers only for the policies it holds.
+        roster = state_store.read_json(_ROSTER_NAME) or {"fetched_at": 0, "expires_at": 0, "policies": {}}
+        if _current(roster, escalation_policy_id, now):
+            return roster
+        fetched = _build_roster(_fetch_oncalls(escalation_policy_id), now)["policies"]
+        # Nobody on call is an answer too; keep it for as long as a sweep would.
+        fetched.setdefault(escalation_policy_id, {"expires_at": now + MAX_TTL_SECONDS, "levels": {}})
+        roster["policies"].update(fetched)
+        state_store.write_json(_ROSTER_NAME, roster)
+        return roster
+
+def oncall_users(escalation_policy_id, escalation_level=None):
+    """Return the users on call for a policy, lowest escalation level first.
+
+    Answered from the local roster; a policy's entries are refetched, on their own, once
+    its earliest current shift has ended.
+    """
+    roster = state_store.read_json(_ROSTER_NAME)
+    if not _current(roster, escalation_policy_id, time.time()):
+        roster = refresh_policy(escalation_policy_id)
+    policy = roster["policies"].get(escalation_policy_id)
+    if not policy:
+        return []
+    levels = sorted(policy["levels"], key=int)
+    if escalation_level is not None:
+        levels = [level for level in levels if int(level) == escalation_level]
+    return [entry for level in levels for entry in policy["levels"][level]]
+
+if __name__ == "__main__":
+    policies = refresh_roster()["policies"]
+    print(f"Cached on-call rosters for {len(policies)} escalation policies")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import re
+import time
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# Pages for the same service whose descriptions normalize to the same text within this
+# window share one incident. 0 disables coalescing.
+DEDUP_WINDOW_SECONDS = int(os.getenv("PD_PAGE_DEDUP_WINDOW_SECONDS", 600))
+
+_STORE_NAME = "page-dedup"
+_URL = re.compile(r"https?://\S+")
+# Long numbers and hex/UUID-like tokens (request IDs, dates, order numbers) and times of
+# day. Short numbers such as status codes or channel numbers tell problems apart, so they stay.
+_ID = re.compile(r"\b(?=[0-9a-f-]*\d)(?:\d{5,}|[0-9a-f][0-9a-f-]{7,})\b")
+_TIME = re.compile(r"\b\d{1,2}:\d{2}(?::\d{2})?\b")
+_PUNCTUATION = re.compile(r"[^\w\s#]")
+
+def normalize_description(description):
+    """Reduce a description to the words that identify the problem.
+
+    Case, punctuation, URLs, IDs and times vary between people reporting the
+    same outage, so they are dropped.
+    """
+    text = _URL.sub(" ", description.lower())
+    text = _TIME.sub("#", _ID.sub("#", text))
+    text = _PUNCTUATION.sub(" ", text)
+    return " ".join(text.split())
+
+def fingerprint(service_id, description):
+    normalized = normalize_description(description)
+    return hashlib.sha256(f"{service_id}|{normalized}".encode("utf-8")).hexdigest()[:32]
+
+def coalesce(service_id, description, create, is_open):
+    """Return `(incident_id, duplicate)`, calling `create()` only for the first page in a window.
+
+    Concurrent pages with the same fingerprint wait on one another, so exactly
+    one of them creates the incident and the rest get its ID back. A page is
+    only a duplicate while `is_open(incident_id)` holds; once the incident is
+    resolved, a recurrence creates a new one.
+    """
+    if DEDUP_WINDOW_SECONDS <= 0:
+        return create(), False
+
+    key = fingerprint(service_id, description)
+    with state_store.striped_lock(_STORE_NAME, key):
+        now = time.time()
+        entry = state_store.read_json(_STORE_NAME, {}).get(key)
+        if entry and entry["created_at"] + DEDUP_WINDOW_SECONDS > now and is_open(entry["incident_id"]):
+            return entry["incident_id"], True
+
+        incident_id = create()
+        with state_store.locked_json(_STORE_NAME) as entries:
+            for stale in [k for k, e in entries.items() if e["created_at"] + DEDUP_WINDOW_SECONDS <= now]:
+                del entries[stale]
+            entries[key] = {"incident_id": incident_id, "created_at": now}
+        return incident_id, False
@@ -1,27 +1,27 @@
 #!/usr/bin/env python3
 
-import os
-import requests
+import sys
+import json
+import time
 import argparse
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
-def _get_or_raise_env_var(env_var):
-    value = os.getenv(env_var)
-    if value is None:
-        raise Exception(f"Env var {env_var} is not set")
-    return value
+try:
+    from . import http_client, page_dedup, tool_config, tracing
+except ImportError:
+    import http_client
+    import page_dedup
+    import tool_config
+    import tracing
 
-def create_pd_incident(description: str):
-    PD_API_KEY = _get_or_raise_env_var("PD_API_KEY")
-    SERVICE_ID = _get_or_raise_env_var("PD_SERVICE_ID")
-    ESCALATION_POLICY_ID = _get_or_raise_env_var("PD_ESCALATION_POLICY_ID")
-    KUBIYA_USER_EMAIL = _get_or_raise_env_var("KUBIYA_USER_EMAIL")
+def incident_url(incident_id):
+    return f"https://aetnd.pagerduty.com/incidents/{incident_id}"
+
+def create_pd_incident(description: str, service_id: str, escalation_policy_id: str):
+    SERVICE_ID = service_id
+    ESCALATION_POLICY_ID = escalation_policy_id
 
     url = "https://api.pagerduty.com/incidents"
-    headers = {
-        "Authorization": f"Token token={PD_API_KEY}",
-        "Content-Type": "application/json",
-        "From": KUBIYA_USER_EMAIL,
-    }
     payload = {
         "incident": {
             "type": "incident",
@@ -34,10 +34,10 @@ def create_pd_incident(description: str):
             "body": {"type": "incident_body", "details": description},
         }
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = http_client.post(url, json=payload)
     try:
         response.raise_for_status()
-    except requests.exceptions.HTTPError as e:
+    except http_client.HTTPError as e:
         raise Exception(f"Failed to create incident: {e}")
 
     try:
@@ -45,15 +45,105 @@ def create_pd_incident(description: str):
     except Exception as e:
         raise Exception(f"Failed to fetch incident id: {e}")
 
+def incident_open(incident_id: str):
+    """Whether the incident is still triggered or acknowledged; a failed check counts as resolved."""
+    try:
+        response = http_client.get(f"https://api.pagerduty.com/incidents/{incident_id}")
+        response.raise_for_status()
+        return response.json()["incident"]["status"] in ("triggered", "acknowledged")
+    except Exception as e:
+        # stderr, as in --batch mode stdout carries only the JSONL results.
+        print(f"Failed to check incident {incident_id}, paging anew: {e}", file=sys.stderr)
+        return False
+
+def add_incident_note(incident_id: str, content: str):
+    url = f"https://api.pagerduty.com/incidents/{incident_id}/notes"
+    response = http_client.post(url, json={"note": {"content": content}})
+    try:
+        response.raise_for_status()
+    except http_client.HTTPError as e:
+        raise Exception(f"Failed to add note to incident {incident_id}: {e}")
+
+def page(config, description, service_id=None, escalation_policy_id=None):
+    """Page the on-call engineer for `service_id`, or add a note to the open page for the same problem.
+
+    Returns `(incident_id, duplicate)`.
+    """
+    with tracing.trace("page_oncall_engineer"):
+        SERVICE_ID = service_id or config.pd_service_id
+        ESCALATION_POLICY_ID = escalation_policy_id or config.pd_escalation_policy_id
+        with tracing.span("step page") as span:
+            pd_incident_id, duplicate = page_dedup.coalesce(
+                SERVICE_ID, description, lambda: create_pd_incident(description, SERVICE_ID, ESCALATION_POLICY_ID), incident_open
+            )
+            span["duplicate"] = duplicate
+        if duplicate:
+            reporter = config.kubiya_user_email
+            with tracing.span("step note"):
+                add_incident_note(pd_incident_id, f"Also reported by {reporter} via Kubi - {description}")
+        return pd_incident_id, duplicate
+
+def _page_request(config, line_number, line):
+    start = time.perf_counter()
+    result = {"line": line_number}
+    try:
+        request = json.loads(line)
+        result["description"] = request["description"]
+        incident_id, duplicate = page(config, request["description"], request.get("service_id"), request.get("escalation_policy_id"))
+        result.update(incident_id=incident_id, url=incident_url(incident_id), duplicate=duplicate)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+def page_stream(config, lines, max_workers):
+    """Page for each JSONL request in `lines`, at most `max_workers` at a time, yielding results as they complete.
+
+    Each request is an object with a "description" and optionally a "service_id"
+    and "escalation_policy_id" (defaulting to the configured ones). Requests are read only as workers free up, so an
+    unbounded stream doesn't pile up in memory.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        in_flight = set()
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            if len(in_flight) >= max_workers:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            in_flight.add(executor.submit(_page_request, config, line_number, line))
+        while in_flight:
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
 def main():
     parser = argparse.ArgumentParser(description="Page the on-call engineer via PagerDuty.")
-    parser.add_argument('--description', required=True, help='The description of the incident for the on-call engineer')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--description', help='The description of the incident for the on-call engineer')
+    source.add_argument('--batch', help='Instead, read page requests as JSONL from this file ("-" for stdin) and write a JSONL result for each as it completes')
+    parser.add_argument('--max_workers', type=int, default=8, help='Pages in flight at once in --batch mode')
     args = parser.parse_args()
 
-    pd_incident_id = create_pd_incident(args.description)
-    print(
-        f"The on-call engineer has been paged. They will reach out to you as soon as possible. Your PagerDuty incident URL is https://aetnd.pagerduty.com/incidents/{pd_incident_id}"
-    )
+    config = tool_config.load("page_oncall_engineer")
+    if args.batch:
+        failed = 0
+        with (sys.stdin if args.batch == "-" else open(args.batch)) as lines:
+            for result in page_stream(config, lines, args.max_workers):
+                failed += "error" in result
+                print(json.dumps(result), flush=True)
+        sys.exit(1 if failed else 0)
+
+    pd_incident_id, duplicate = page(config, args.description)
+    if not duplicate:
+        print(
+            f"The on-call engineer has been paged. They will reach out to you as soon as possible. Your PagerDuty incident URL is {incident_url(pd_incident_id)}"
+        )
+    else:
+        print(
+            f"The on-call engineer has already been paged for this issue. They will reach out as soon as possible. The PagerDuty incident URL is {incident_url(pd_incident_id)}"
+        )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import random
+import time
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# (requests per second, burst) per vendor host, kept a little under each vendor's
+# documented limit. Buckets live in the shared state directory, so concurrent tool
+# runs draw from the same allowance. Hosts not listed are not throttled.
+HOST_LIMITS = {
+    "api.pagerduty.com": (12.0, 20),
+    "aenetworks.freshservice.com": (1.5, 10),
+    "aenetworks-fs-sandbox.freshservice.com": (1.5, 10),
+    "slack.com": (1.0, 5),
+    "graph.microsoft.com": (10.0, 20),
+    "login.microsoftonline.com": (5.0, 10),
+}
+
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+def _bucket_name(host):
+    return f"ratelimit-{host}"
+
+def acquire(host, max_wait=None):
+    """Block until `host`'s shared token bucket allows another request.
+
+    Returns False without taking a token if that would mean waiting longer
+    than `max_wait` seconds.
+    """
+    limit = HOST_LIMITS.get(host)
+    if limit is None:
+        return True
+    rate, burst = limit
+    while True:
+        with state_store.locked_json(_bucket_name(host)) as bucket:
+            now = time.time()
+            tokens = min(burst, bucket.get("tokens", burst) + (now - bucket.get("updated_at", now)) * rate)
+            bucket["updated_at"] = now
+            blocked_until = bucket.get("blocked_until", 0)
+            if blocked_until > now:
+                bucket["tokens"] = tokens
+                wait = blocked_until - now
+            elif tokens >= 1:
+                bucket["tokens"] = tokens - 1
+                return True
+            else:
+                bucket["tokens"] = tokens
+                wait = (1 - tokens) / rate
+        if max_wait is not None and wait > max_wait:
+            return False
+        time.sleep(wait)
+        if max_wait is not None:
+            max_wait -= wait
+
+def block_until(host, until):
+    """Hold every caller of `host` back until `until`, e.g. after a 429."""
+    if host not in HOST_LIMITS:
+        return
+    with state_store.locked_json(_bucket_name(host)) as bucket:
+        bucket["blocked_until"] = max(bucket.get("blocked_until", 0), until)
+
+def _header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+def _seconds_from_header(value, now):
+    try:
+        seconds = float(value)
+    except ValueError:
+        from email.utils import parsedate_to_datetime  # Rarely needed, and slow to import.
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+        except (TypeError, ValueError):
+            return None
+    # Some vendors send the reset as an epoch timestamp rather than a delay.
+    return max(0.0, seconds - now) if seconds > 1e9 else seconds
+
+def observe(host, headers):
+    """Pause `host` until its window resets once the vendor reports no requests remaining."""
+    remaining = _header(headers, "X-RateLimit-Remaining", "RateLimit-Remaining")
+    reset = _header(headers, "X-RateLimit-Reset", "RateLimit-Reset")
+    if remaining is None or reset is None:
+        return
+    try:
+        exhausted = int(float(remaining)) <= 0
+    except ValueError:
+        return
+    now = time.time()
+    seconds = _seconds_from_header(reset, now)
+    if exhausted and seconds is not None:
+        block_until(host, now + seconds)
+
+def retry_delay(headers, attempt):
+    """Seconds to wait before retry number `attempt` (0-based) of a throttled request.
+
+    Honors Retry-After or the rate-limit reset header when the vendor sends one,
+    otherwise backs off exponentially with full jitter.
+    """
+    now = time.time()
+    value = _header(headers, "Retry-After", "X-RateLimit-Reset", "RateLimit-Reset")
+    if value is not None:
+        seconds = _seconds_from_header(value, now)
+        if seconds is not None:
+            return min(seconds, BACKOFF_MAX_SECONDS)
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from . import deferred_actions, http_client, tool_config, trigger_major_incident
+except ImportError:
+    import deferred_actions
+    import http_client
+    import tool_config
+    import trigger_major_incident
+
+# Sandbox runs title their PD incidents and subject their tickets with this prefix.
+TEST_PREFIX = "TEST TICKET.IGNORE"
+PAGE_SIZE = 100
+# PagerDuty's bulk incident update accepts up to 250 incidents per request.
+PD_BULK_SIZE = 100
+_FS_OPEN_STATUSES = {2, 3}
+
+def _close_ticket(config, ticket_id):
+    if trigger_major_incident.close_ticket(config, ticket_id) is None:
+        raise Exception(f"Failed to close ticket {ticket_id}")
+
+def handlers(config):
+    return {
+        "close_pd_incident": trigger_major_incident.close_pd_incident,
+        "close_ticket": lambda ticket_id: _close_ticket(config, ticket_id),
+    }
+
+def run_pending_cleanups(config, batch_size, max_workers):
+    total_succeeded = total_failed = 0
+    while True:
+        succeeded, failed = deferred_actions.run_due(handlers(config), batch_size=batch_size, max_workers=max_workers)
+        total_succeeded += succeeded
+        total_failed += failed
+        if succeeded + failed < batch_size:
+            return total_succeeded, total_failed
+
+def list_test_incidents(service_id):
+    """IDs of every open PD incident created by a sandbox run on `service_id`, the service sandbox runs raise them on."""
+    incident_ids = []
+    offset = 0
+    while True:
+        response = http_client.get(
+            "https://api.pagerduty.com/incidents",
+            params={"statuses[]": ["triggered", "acknowledged"], "service_ids[]": [service_id], "date_range": "all", "limit": PAGE_SIZE, "offset": offset},
+        )
+        response.raise_for_status()
+        data = response.json()
+        incident_ids.extend(incident["id"] for incident in data.get("incidents", []) if incident.get("title", "").startswith(TEST_PREFIX))
+        if not data.get("more"):
+            return incident_ids
+        offset += PAGE_SIZE
+
+def list_test_tickets(config):
+    """IDs of every open Freshservice sandbox ticket created by a sandbox run, linked to an incident or not.
+
+    Freshservice filters on the sandbox tag and status itself, so only the leftovers are paged through.
+    """
+    query = f"tag:'{trigger_major_incident.SANDBOX_TICKET_TAG}' AND ({' OR '.join(f'status:{status}' for status in sorted(_FS_OPEN_STATUSES))})"
+    ticket_ids = []
+    page, seen = 1, 0
+    while True:
+        response = http_client.get(f"{config.freshservice_url}/api/v2/tickets/filter", params={"query": f'"{query}"', "page": page})
+        response.raise_for_status()
+        data = response.json()
+        tickets = data.get("tickets", [])
+        seen += len(tickets)
+        ticket_ids.extend(ticket["id"] for ticket in tickets if (ticket.get("subject") or "").startswith(TEST_PREFIX))
+        if not tickets or seen >= data.get("total", float("inf")):
+            return ticket_ids
+        page += 1
+
+def resolve_incidents(incident_ids):
+    response = http_client.put(
+        "https://api.pagerduty.com/incidents",
+        json={"incidents": [{"id": incident_id, "type": "incident_reference", "status": "resolved"} for incident_id in incident_ids]},
+    )
+    response.raise_for_status()
+    return len(incident_ids)
+
+def sweep(config, max_workers):
+    """Resolve every leftover sandbox incident and ticket; returns (resolved, failed) counts.
+
+    Incidents are resolved in bulk requests, tickets one request each, all on a
+    bounded pool whose requests draw on http_client's shared per-host rate limits.
+    """
+    start = time.monotonic()
+    incident_ids = list_test_incidents(config.pd_service_id)
+    ticket_ids = list_test_tickets(config)
+    print(f"Found {len(incident_ids)} open test incidents and {len(ticket_ids)} open test tickets in {time.monotonic() - start:.1f}s")
+
+    resolved = failed = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(resolve_incidents, incident_ids[i:i + PD_BULK_SIZE]): len(incident_ids[i:i + PD_BULK_SIZE])
+            for i in range(0, len(incident_ids), PD_BULK_SIZE)
+        }
+        futures.update({executor.submit(_close_ticket, config, ticket_id): 1 for ticket_id in ticket_ids})
+        for future in as_completed(futures):
+            try:
+                future.result()
+                resolved += futures[future]
+            except Exception as e:
+                failed += futures[future]
+                print(f"Failed to resolve {futures[future]} test artifact(s): {e}")
+
+    elapsed = time.monotonic() - start
+    print(f"Resolved {resolved} test artifacts ({failed} failed) in {elapsed:.1f}s, {resolved / elapsed if elapsed else 0:.1f}/s")
+    return resolved, failed
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the sandbox cleanups deferred by trigger_major_incident.")
+    parser.add_argument("--batch_size", type=int, default=50, help="Cleanups claimed per batch")
+    parser.add_argument("--max_workers", type=int, default=8, help="Cleanups run concurrently within a batch")
+    parser.add_argument("--loop_interval", type=int, default=0, help="Keep polling every N seconds instead of exiting")
+    parser.add_argument("--sweep", action="store_true", help="Instead, find and resolve every open test incident and ticket, queued or not")
+    args = parser.parse_args()
+
+    config = tool_config.load("sandbox_cleanup")
+    if config.production:
+        raise Exception("Sandbox cleanup only runs against the Freshservice sandbox; unset FSAPI_PROD")
+
+    if args.sweep:
+        sweep(config, args.max_workers)
+        return
+
+    while True:
+        try:
+            succeeded, failed = run_pending_cleanups(config, args.batch_size, args.max_workers)
+            print(f"Ran {succeeded + failed} due cleanups: {succeeded} succeeded, {failed} failed, {len(deferred_actions.pending())} pending")
+        except Exception as e:
+            if not args.loop_interval:
+                raise
+            # A long-running worker outlives a bad batch; its actions are retried once their lease lapses.
+            print(f"Failed to run due cleanups: {e}")
+        if not args.loop_interval:
+            break
+        time.sleep(args.loop_interval)
+
+if __name__ == "__main__":
+    main()
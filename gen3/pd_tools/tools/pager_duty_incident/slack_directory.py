@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+try:
+    from . import http_client, state_store
+except ImportError:
+    import http_client
+    import state_store
+
+# The index is rebuilt from users.list in the background (webhook_server, or this module run
+# on a schedule), a few pages at a time, so a lookup never waits on a sync. A pass that
+# finished within this long is current; in between, misses are filled one by one.
+INDEX_TTL_SECONDS = int(os.getenv("SLACK_DIRECTORY_TTL_SECONDS", 24 * 3600))
+REFRESH_INTERVAL_SECONDS = int(os.getenv("SLACK_DIRECTORY_REFRESH_SECONDS", 300))
+PAGE_SIZE = 200
+# users.list pages per refresh, kept well inside the slack.com burst that chat.postMessage also draws on.
+REFRESH_PAGES = 3
+
+_INDEX_NAME = "slack-directory"
+
+def _empty_index():
+    return {"synced_at": 0, "cursor": None, "users": {}}
+
+def _fresh(index):
+    return bool(index) and index.get("synced_at", 0) + INDEX_TTL_SECONDS > time.time()
+
+def refresh_due():
+    """Whether a pass is under way or the last one is older than the TTL."""
+    index = state_store.read_json(_INDEX_NAME)
+    return not _fresh(index) or bool(index.get("cursor"))
+
+def refresh_directory(max_pages=REFRESH_PAGES):
+    """Page up to `max_pages` further through users.list and merge those users into the index.
+
+    The cursor is kept in the index, so successive calls walk the whole directory; returns
+    True once a call reaches the last page, which marks the index synced.
+    """
+    cursor = (state_store.read_json(_INDEX_NAME) or {}).get("cursor")
+    active, deleted = {}, set()
+    for _ in range(max_pages):
+        params = {"limit": PAGE_SIZE}
+        if cursor:
+            params["cursor"] = cursor
+        response = http_client.get("https://slack.com/api/users.list", params=params)
+        response.raise_for_status()
+        data = response.json()
+        if not data.get("ok"):
+            raise Exception(f"Failed to list Slack users: {data.get('error')}")
+        for member in data.get("members", []):
+            email = member.get("profile", {}).get("email")
+            if not email:
+                continue
+            if member.get("deleted"):
+                deleted.add(email.lower())
+            else:
+                active[email.lower()] = member["id"]
+        cursor = data.get("response_metadata", {}).get("next_cursor") or None
+        if not cursor:
+            break
+
+    with state_store.locked_json(_INDEX_NAME, _empty_index) as index:
+        index.setdefault("users", {}).update(active)
+        for email in deleted:
+            index["users"].pop(email, None)
+        index["cursor"] = cursor
+        if not cursor:
+            index["synced_at"] = time.time()
+    return not cursor
+
+def sync_directory(force=False):
+    """Finish a pass over users.list unless the index is already current."""
+    if not force and not refresh_due():
+        return
+    while not refresh_directory():
+        pass
+
+def _lookup_by_email(email):
+    response = http_client.get("https://slack.com/api/users.lookupByEmail", params={"email": email})
+    response_data = response.json()
+    if response_data.get("ok"):
+        return response_data["user"]["id"]
+    print(f"Error fetching user ID for {email}: {response_data.get('error')}")
+    return None
+
+def lookup_user_id(email):
+    """Resolve a Slack user ID from the local index, falling back to users.lookupByEmail on a miss."""
+    key = email.lower()
+    # Whatever the index holds, however old: user IDs don't change, and a miss costs one call.
+    user_id = (state_store.read_json(_INDEX_NAME) or _empty_index()).get("users", {}).get(key)
+    if user_id:
+        return user_id
+
+    user_id = _lookup_by_email(email)
+    if user_id:
+        with state_store.locked_json(_INDEX_NAME, _empty_index) as index:
+            index.setdefault("users", {})[key] = user_id
+    return user_id
+
+if __name__ == "__main__":
+    sync_directory(force=True)
+    print(f"Synced {len(state_store.read_json(_INDEX_NAME)['users'])} Slack users")
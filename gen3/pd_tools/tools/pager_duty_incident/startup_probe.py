@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+# Tool.content exports this (`date +%s%N`) as its first command, so the gap to the
+# interpreter start covers everything the shell does first, such as installs.
+CONTAINER_ENTRY_ENV_VAR = "PD_TOOLS_CONTAINER_ENTRY_NS"
+
+PHASES = ("container_entry", "interpreter_start", "imports_done", "exit")
+
+def container_entry_ns():
+    value = os.getenv(CONTAINER_ENTRY_ENV_VAR, "")
+    return int(value) if value.isdigit() else None
+
+def interpreter_start_ns():
+    """When this process started, to the kernel's 10 ms tick, or None off Linux."""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name start at field 3; starttime is field 22.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    seconds_since_start = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+    return time.time_ns() - int(seconds_since_start * 1e9)
+
+def report(imports_done_ns, exit_ns):
+    """The startup timestamps of this run and the milliseconds spent between each known pair."""
+    timestamps = {
+        "container_entry": container_entry_ns(),
+        "interpreter_start": interpreter_start_ns(),
+        "imports_done": imports_done_ns,
+        "exit": exit_ns,
+    }
+    known = [(phase, timestamps[phase]) for phase in PHASES if timestamps[phase] is not None]
+    return {
+        "timestamps_ns": timestamps,
+        "phases_ms": {
+            f"{start}_to_{end}": round((end_ns - start_ns) / 1e6, 3)
+            for (start, start_ns), (end, end_ns) in zip(known, known[1:])
+        },
+    }
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+try:
+    from . import deadlines
+except ImportError:
+    import deadlines
+
+# Point this at a volume shared by the tool containers so state outlives a single run.
+STATE_DIR = os.getenv("PD_TOOLS_STATE_DIR", "/tmp/pd_tools_state")
+
+def state_path(name, suffix=".json"):
+    os.makedirs(STATE_DIR, mode=0o700, exist_ok=True)
+    return os.path.join(STATE_DIR, f"{name}{suffix}")
+
+# Per-key locks share this many lock files per name, so the files don't grow with the keys.
+LOCK_STRIPES = 64
+# How often a lock wait under a deadline retries.
+LOCK_POLL_SECONDS = 0.01
+
+def _acquire(lock_file, name):
+    if deadlines.remaining() is None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return
+        except BlockingIOError:
+            left = deadlines.remaining()
+            if left <= 0:
+                raise TimeoutError(f"Deadline exceeded waiting for the {name} lock")
+            time.sleep(min(LOCK_POLL_SECONDS, left))
+
+@contextmanager
+def file_lock(name):
+    """Hold an exclusive lock on `name` across threads and processes sharing STATE_DIR.
+
+    Inside a deadline, gives up with TimeoutError once it passes.
+    """
+    with open(state_path(name, ".lock"), "a") as lock_file:
+        _acquire(lock_file, name)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def striped_lock(name, key):
+    """file_lock on the one of `name`'s LOCK_STRIPES locks that `key` falls in.
+
+    Holders of the same key exclude each other; keys sharing a stripe only take turns.
+    """
+    stripe = int(hashlib.sha256(key.encode("utf-8")).hexdigest()[:8], 16) % LOCK_STRIPES
+    return file_lock(f"{name}-stripe-{stripe}")
+
+def read_json(name, default=None):
+    try:
+        with open(state_path(name)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+def write_json(name, data):
+    """Replace the stored value atomically, so lock-free readers never see a partial file."""
+    path = state_path(name)
+    fd, tmp_path = tempfile.mkstemp(dir=STATE_DIR, prefix=f".{name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+@contextmanager
+def locked_json(name, default_factory=dict):
+    """Read-modify-write `name` under its lock; changes to the yielded value are saved on exit."""
+    with file_lock(name):
+        data = read_json(name)
+        if data is None:
+            data = default_factory()
+        yield data
+        write_json(name, data)
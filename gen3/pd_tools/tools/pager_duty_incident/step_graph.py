@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+try:
+    from . import tracing
+except ImportError:
+    import tracing
+
+
+class Step:
+    """A unit of work in a workflow.
+
+    `func` is called with the results of the steps named in `deps`, passed as
+    keyword arguments under those same names. An optional step that fails
+    yields `default` instead of aborting the run.
+    """
+
+    def __init__(self, name, func, deps=(), optional=False, default=None):
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.optional = optional
+        self.default = default
+
+
+def _validate(steps_by_name):
+    for step in steps_by_name.values():
+        for dep in step.deps:
+            if dep not in steps_by_name:
+                raise Exception(f"Step {step.name} depends on unknown step {dep}")
+
+
+def _run_step(step, kwargs):
+    with tracing.span(f"step {step.name}"):
+        return step.func(**kwargs)
+
+
+def run_step_graph(steps, max_workers=None):
+    """Run `steps` concurrently, each as soon as its dependencies have finished.
+
+    Returns a dict mapping step names to their results. The first failing
+    required step aborts the run: steps that have not started yet are never
+    submitted. Each step runs in a copy of the caller's context, so context
+    variables such as the http_client deadline and the current trace carry
+    over to the workers.
+    """
+    steps_by_name = {step.name: step for step in steps}
+    _validate(steps_by_name)
+
+    results = {}
+    waiting = dict(steps_by_name)
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers or len(steps_by_name) or 1) as executor:
+        while waiting or running:
+            for name, step in list(waiting.items()):
+                if all(dep in results for dep in step.deps):
+                    kwargs = {dep: results[dep] for dep in step.deps}
+                    running[executor.submit(contextvars.copy_context().run, _run_step, step, kwargs)] = name
+                    del waiting[name]
+            if not running:
+                raise Exception(f"Steps have circular dependencies: {', '.join(sorted(waiting))}")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    if not steps_by_name[name].optional:
+                        raise Exception(f"Step {name} failed: {e}") from e
+                    print(f"Optional step {name} failed, continuing without it: {e}")
+                    results[name] = steps_by_name[name].default
+    return results
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+
+import hashlib
+import time
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# Refresh this long before expiry so a token is never handed out just as it lapses.
+REFRESH_AHEAD_SECONDS = 300
+
+def _cache_name(tenant_id, client_id, scope):
+    digest = hashlib.sha256(f"{tenant_id}|{client_id}|{scope}".encode("utf-8")).hexdigest()[:16]
+    return f"token-{digest}"
+
+def _usable(entry):
+    return bool(entry) and entry.get("expires_at", 0) - REFRESH_AHEAD_SECONDS > time.time()
+
+def cached_token(tenant_id, client_id, scope, fetch):
+    """Return a cached access token for (tenant, client, scope), calling `fetch` when it is due.
+
+    `fetch` returns `(access_token, expires_in)`. Concurrent callers, in this
+    process or in other containers sharing the state directory, wait on one
+    refresh instead of each requesting their own token.
+    """
+    name = _cache_name(tenant_id, client_id, scope)
+    entry = state_store.read_json(name)
+    if _usable(entry):
+        return entry["access_token"]
+
+    with state_store.file_lock(name):
+        entry = state_store.read_json(name)
+        if _usable(entry):
+            return entry["access_token"]
+        access_token, expires_in = fetch()
+        state_store.write_json(name, {"access_token": access_token, "expires_at": time.time() + expires_in})
+        return access_token
@@ -1,27 +1,54 @@
-import inspect
+import base64
+import functools
+from pathlib import Path
 
 from kubiya_sdk import tool_registry
-from kubiya_sdk.tools.models import Arg, Tool, FileSpec
+from kubiya_sdk.tools.models import Arg, Tool, FileSpec, Volume
 
-from . import fake_tool, webhook_incident_response, page_oncall_engineer, trigger_major_incident
+try:
+    from . import bundle
+except ImportError:
+    import bundle
+
+TOOL_DIR = Path(__file__).parent
+
+# The scripts are shipped as source text, so they are read from disk rather than imported:
+# loading the registry doesn't pay for their imports (or run their module-level code), and a
+# script shared by several tools is read once.
+@functools.lru_cache(maxsize=None)
+def _file_spec(module):
+    return FileSpec(destination=f"/tmp/{module}.py", content=(TOOL_DIR / f"{module}.py").read_text())
+
+def _files(*modules):
+    return [_file_spec(module) for module in modules]
+
+# The PD tools run from one zipapp of every script and its shared code, with bytecode
+# precompiled, instead of a loose copy of each module compiled again on every run. Loading
+# the registry reads the archive bundle.py built, building it first if it is missing or stale.
+# FileSpec content is text, so the archive ships base64-encoded and the tool decodes it.
+@functools.lru_cache(maxsize=None)
+def _bundle_spec():
+    return FileSpec(destination="/tmp/pdtools.pyz.b64", content=base64.b64encode(bundle.read_artifact()).decode("ascii"))
+
+# Caches and queues shared between runs (Azure token, Slack directory, on-call roster,
+# deferred sandbox cleanups, recent pages, vendor rate-limit buckets, circuit breaker
+# windows, workflow journals, processed webhook deliveries) live on this volume, as does
+# pd_tools.prom, the vendor-call metrics for node_exporter's textfile collector.
+STATE_VOLUME = Volume(name="pd-tools-state", path="/var/lib/pd_tools")
 
 fake_tool = Tool(
     name="fake-tool",
-    description="This is a fake tool",
+    description="A no-op tool that reports its own startup timeline (container entry, interpreter start, imports, exit) as a baseline for the docker tool runtime's overhead.",
     type="docker",
     image="python:3.11-bullseye",
     args=[],
     secrets=[],
     env=[],
     content="""
+    export PD_TOOLS_CONTAINER_ENTRY_NS=$(date +%s%N)
     python /tmp/fake_tool.py
     """,
-    with_files=[
-        FileSpec(
-            destination="/tmp/fake_tool.py",
-            content=inspect.getsource(fake_tool),
-        ),
-    ]
+    with_files=_files("fake_tool", "startup_probe"),
 )
 
 webhook_incident_response_tool = Tool(
@@ -35,11 +62,6 @@ webhook_incident_response_tool = Tool(
             required=True,
             description="The description of the incident for the on-call engineer. You must confirm the values before triggering a major incident.",
         ),
-        Arg(
-            name="business_impact",
-            required=True,
-            description="The business impact of the incident. You must confirm the values before triggering a major incident.",
-        ),
         Arg(
             name="servicename",
             required=True,
@@ -84,10 +106,10 @@ webhook_incident_response_tool = Tool(
     secrets=["FSAPI_PROD", "SLACK_API_TOKEN"],
     env=["KUBIYA_USER_EMAIL"],
     content="""
-pip install requests==2.32.3 > /dev/null 2>&1
+export PD_TOOLS_CONTAINER_ENTRY_NS=$(date +%s%N)
+export PD_TOOLS_STATE_DIR=/var/lib/pd_tools
 
 echo "Passed description: $description"
-echo "Passed business_impact: $business_impact"
 echo "Passed servicename: $servicename"
 echo "Passed title: $title"
 echo "Passed incident_url: $incident_url"
@@ -97,14 +119,30 @@ echo "Passed slackbusinessimpact: $slackbusinessimpact"
 echo "Passed incident_id: $incident_id"
 echo "Passed bridge_url: $bridge_url"
 
-python /tmp/webhook_incident_response.py --description "$description" --business_impact "$business_impact" --servicename "$servicename" --title "$title" --incident_url "$incident_url" --slackincidentcommander "$slackincidentcommander" --slackdetectionmethod "$slackdetectionmethod" --slackbusinessimpact "$slackbusinessimpact" --incident_id "$incident_id" --bridge_url "$bridge_url"
+base64 -d /tmp/pdtools.pyz.b64 > /tmp/pdtools.pyz
+python /tmp/pdtools.pyz webhook_incident_response --description "$description" --servicename "$servicename" --title "$title" --incident_url "$incident_url" --slackincidentcommander "$slackincidentcommander" --slackdetectionmethod "$slackdetectionmethod" --slackbusinessimpact "$slackbusinessimpact" --incident_id "$incident_id" --bridge_url "$bridge_url" --reporter_email "$KUBIYA_USER_EMAIL"
 """,
-    with_files=[
-        FileSpec(
-            destination="/tmp/webhook_incident_response.py",
-            content=inspect.getsource(webhook_incident_response),
-        ),
-    ]
+    with_files=[_bundle_spec()],
+    with_volumes=[STATE_VOLUME],
+)
+
+webhook_incident_receiver_tool = Tool(
+    name="webhook-incident-receiver",
+    description="Long-running receiver for PagerDuty v3 webhooks. Validates each delivery's signature and runs the webhook-incident-response ticket and Slack flow on a bounded worker pool with warm connections and caches, keeping the Slack directory and the PagerDuty on-call roster refreshed in the background.",
+    type="docker",
+    image="python:3.11-bullseye",
+    args=[],
+    secrets=["PD_WEBHOOK_SECRET", "PD_API_KEY", "FSAPI_PROD", "SLACK_API_TOKEN"],
+    env=["KUBIYA_USER_EMAIL"],
+    long_running=True,
+    content="""
+export PD_TOOLS_STATE_DIR=/var/lib/pd_tools
+
+base64 -d /tmp/pdtools.pyz.b64 > /tmp/pdtools.pyz
+python /tmp/pdtools.pyz webhook_server --port 8080
+""",
+    with_files=[_bundle_spec()],
+    with_volumes=[STATE_VOLUME],
 )
 
 page_oncall_engineer_tool = Tool(
@@ -126,18 +164,16 @@ page_oncall_engineer_tool = Tool(
         "KUBIYA_USER_EMAIL",
     ],
     content="""
-pip install requests==2.32.3 > /dev/null 2>&1
+export PD_TOOLS_CONTAINER_ENTRY_NS=$(date +%s%N)
+export PD_TOOLS_STATE_DIR=/var/lib/pd_tools
 
 echo "Passed description: $description"
 
-python /tmp/page_oncall_engineer.py --description "$description"
+base64 -d /tmp/pdtools.pyz.b64 > /tmp/pdtools.pyz
+python /tmp/pdtools.pyz page_oncall_engineer --description "$description"
 """,
-    with_files=[
-        FileSpec(
-            destination="/tmp/page_oncall_engineer.py",
-            content=inspect.getsource(page_oncall_engineer),
-        ),
-    ]
+    with_files=[_bundle_spec()],
+    with_volumes=[STATE_VOLUME],
 )
 
 trigger_major_incident_communication_tool = Tool(
@@ -155,32 +191,58 @@ trigger_major_incident_communication_tool = Tool(
             name="business_impact",
             required=True,
             description="The business impact of the incident. You must confirm the values before triggering a major incident.",
-        )
+        ),
+        Arg(
+            name="idempotency_key",
+            required=False,
+            description="Optional. Retrying with the same key resumes the earlier attempt, even a finished one, instead of creating a second incident and ticket. Defaults to one derived from the reporter, description and business impact, which resumes only an attempt that didn't finish.",
+        ),
     ],
     secrets=["PD_API_KEY", "AZURE_TENANT_ID", "AZURE_CLIENT_ID", "AZURE_CLIENT_SECRET", "FSAPI_SANDBOX", "SLACK_API_TOKEN"],
     env=[
         "PD_SERVICE_ID",
         "PD_ESCALATION_POLICY_ID",
         "KUBIYA_USER_EMAIL",
-        "INCIDENT_RESPONSE_CHANNEL_ID"
+        "INCIDENT_RESPONSE_CHANNEL_ID",
+        "INCIDENT_RESPONSE_CHANNEL_NAME",
+        "STANDING_BRIDGE_URL"
     ],
     content="""
-pip install requests==2.32.3 > /dev/null 2>&1
+export PD_TOOLS_CONTAINER_ENTRY_NS=$(date +%s%N)
+export PD_TOOLS_STATE_DIR=/var/lib/pd_tools
 
 echo "Passed description: $description"
 echo "Passed business_impact: $business_impact"
 
-python /tmp/trigger_major_incident.py --description "$description" --business_impact "$business_impact"
+base64 -d /tmp/pdtools.pyz.b64 > /tmp/pdtools.pyz
+python /tmp/pdtools.pyz trigger_major_incident --description "$description" --business_impact "$business_impact" --idempotency_key "${idempotency_key:-}"
 """,
-    with_files=[
-        FileSpec(
-            destination="/tmp/trigger_major_incident.py",
-            content=inspect.getsource(trigger_major_incident),
-        ),
-    ]
+    with_files=[_bundle_spec()],
+    with_volumes=[STATE_VOLUME],
+)
+
+sandbox_cleanup_tool = Tool(
+    name="sandbox-cleanup-worker",
+    description="Long-running worker that closes the TEST PagerDuty incidents and Freshservice sandbox tickets left by sandbox runs of trigger-major-incident-communication, checking every 15 seconds for cleanups that are due.",
+    type="docker",
+    image="python:3.11-bullseye",
+    args=[],
+    secrets=["PD_API_KEY", "FSAPI_SANDBOX"],
+    env=["PD_SERVICE_ID", "KUBIYA_USER_EMAIL"],
+    long_running=True,
+    content="""
+export PD_TOOLS_STATE_DIR=/var/lib/pd_tools
+
+base64 -d /tmp/pdtools.pyz.b64 > /tmp/pdtools.pyz
+python /tmp/pdtools.pyz sandbox_cleanup --loop_interval 15
+""",
+    with_files=[_bundle_spec()],
+    with_volumes=[STATE_VOLUME],
 )
 
 tool_registry.register("aedm", fake_tool)
 tool_registry.register("aedm", webhook_incident_response_tool)
+tool_registry.register("aedm", webhook_incident_receiver_tool)
 tool_registry.register("aedm", page_oncall_engineer_tool)
-tool_registry.register("aedm", trigger_major_incident_communication_tool)
\ No newline at end of file
+tool_registry.register("aedm", trigger_major_incident_communication_tool)
+tool_registry.register("aedm", sandbox_cleanup_tool)
\ No newline at end of file
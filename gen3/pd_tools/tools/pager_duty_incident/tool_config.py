@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+import os
+from typing import NamedTuple, Optional
+
+# Variables each tool needs, checked together before it makes any vendor call, so a
+# misconfigured run fails at once instead of after creating an incident or a ticket.
+# Secrets that http_client reads itself (vendor API keys) are checked here too.
+REQUIRED = {
+    "page_oncall_engineer": ("PD_API_KEY", "PD_SERVICE_ID", "PD_ESCALATION_POLICY_ID", "KUBIYA_USER_EMAIL"),
+    "trigger_major_incident": (
+        "PD_API_KEY", "PD_SERVICE_ID", "PD_ESCALATION_POLICY_ID", "KUBIYA_USER_EMAIL",
+        "AZURE_TENANT_ID", "AZURE_CLIENT_ID", "AZURE_CLIENT_SECRET",
+        "SLACK_API_TOKEN", "INCIDENT_RESPONSE_CHANNEL_ID", "INCIDENT_RESPONSE_CHANNEL_NAME",
+        # Announced whenever the Teams meeting isn't ready, so the SEV1 post always has a bridge.
+        "STANDING_BRIDGE_URL",
+    ),
+    # Tickets go to the production Freshservice only.
+    "webhook_incident_response": ("FSAPI_PROD", "SLACK_API_TOKEN"),
+    # PD_API_KEY for the on-call roster the server keeps prefetched.
+    "webhook_server": ("PD_WEBHOOK_SECRET", "PD_API_KEY", "FSAPI_PROD", "SLACK_API_TOKEN"),
+    "sandbox_cleanup": ("PD_API_KEY", "PD_SERVICE_ID", "KUBIYA_USER_EMAIL", "FSAPI_SANDBOX"),
+}
+# Tools that run against either Freshservice: FSAPI_PROD selects production, otherwise
+# FSAPI_SANDBOX must be set.
+NEEDS_ENVIRONMENT = {"trigger_major_incident"}
+
+FRESHSERVICE_URLS = {
+    True: "https://aenetworks.freshservice.com",
+    False: "https://aenetworks-fs-sandbox.freshservice.com",
+}
+
+class Config(NamedTuple):
+    tool: str
+    production: bool
+    freshservice_url: str
+    kubiya_user_email: Optional[str]
+    pd_service_id: Optional[str]
+    pd_escalation_policy_id: Optional[str]
+    azure_tenant_id: Optional[str]
+    azure_client_id: Optional[str]
+    azure_client_secret: Optional[str]
+    incident_response_channel_id: Optional[str]
+    incident_response_channel_name: Optional[str]
+    standing_bridge_url: Optional[str]
+
+def load(tool):
+    """Read `tool`'s configuration from the environment, raising if anything it needs is missing."""
+    missing = [env_var for env_var in REQUIRED[tool] if not os.getenv(env_var)]
+    if tool in NEEDS_ENVIRONMENT and not (os.getenv("FSAPI_PROD") or os.getenv("FSAPI_SANDBOX")):
+        missing.append("FSAPI_PROD or FSAPI_SANDBOX")
+    if missing:
+        raise Exception(f"{tool} is missing configuration: {', '.join(missing)} not set")
+
+    production = bool(os.getenv("FSAPI_PROD"))
+    return Config(
+        tool=tool,
+        production=production,
+        freshservice_url=FRESHSERVICE_URLS[production],
+        kubiya_user_email=os.getenv("KUBIYA_USER_EMAIL"),
+        pd_service_id=os.getenv("PD_SERVICE_ID"),
+        pd_escalation_policy_id=os.getenv("PD_ESCALATION_POLICY_ID"),
+        azure_tenant_id=os.getenv("AZURE_TENANT_ID"),
+        azure_client_id=os.getenv("AZURE_CLIENT_ID"),
+        azure_client_secret=os.getenv("AZURE_CLIENT_SECRET"),
+        incident_response_channel_id=os.getenv("INCIDENT_RESPONSE_CHANNEL_ID"),
+        incident_response_channel_name=os.getenv("INCIDENT_RESPONSE_CHANNEL_NAME"),
+        standing_bridge_url=os.getenv("STANDING_BRIDGE_URL"),
+    )
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from . import startup_probe
+except ImportError:
+    import startup_probe
+
+# Each finished trace is written to stderr as one JSON line. Setting this also appends it,
+# in OTLP/JSON form, to the given file for an OpenTelemetry collector to pick up.
+OTLP_FILE = os.getenv("PD_TOOLS_TRACE_OTLP_FILE")
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+_current_span = contextvars.ContextVar("span", default=None)
+_startup_reported = False
+
+class _Trace:
+    def __init__(self, name):
+        self.name = name
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.lock = threading.Lock()
+
+@contextmanager
+def span(name, **attributes):
+    """Time the enclosed block as a child of the current span.
+
+    Yields the span's attribute dict, so the block can record results such as
+    a response status. Outside of a trace() this records nothing.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        yield dict(attributes)
+        return
+
+    record = {
+        "name": name,
+        "span_id": os.urandom(8).hex(),
+        "parent_id": _current_span.get(),
+        "start_ns": time.time_ns(),
+        "status": "ok",
+        "attributes": dict(attributes),
+    }
+    token = _current_span.set(record["span_id"])
+    start = time.perf_counter()
+    try:
+        yield record["attributes"]
+    except BaseException as e:
+        record["status"] = "error"
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        record["end_ns"] = record["start_ns"] + int(record["duration_ms"] * 1e6)
+        _current_span.reset(token)
+        with trace.lock:
+            trace.spans.append(record)
+
+@contextmanager
+def trace(name, **attributes):
+    """Record every span in the enclosed block, including those in steps it starts, and emit them at the end.
+
+    Nested inside another trace this is just a span.
+    """
+    if _current_trace.get() is not None:
+        with span(name, **attributes) as span_attributes:
+            yield span_attributes
+        return
+
+    current = _Trace(name)
+    token = _current_trace.set(current)
+    try:
+        with span(name, **attributes) as span_attributes:
+            yield span_attributes
+    finally:
+        _current_trace.reset(token)
+        _emit(current)
+
+def _emit(trace):
+    global _startup_reported
+    root = next(record for record in trace.spans if record["parent_id"] is None)
+    output = {
+        "trace_id": trace.trace_id,
+        "name": trace.name,
+        "status": root["status"],
+        "duration_ms": root["duration_ms"],
+        "spans": sorted(trace.spans, key=lambda record: record["start_ns"]),
+    }
+    # The first trace of a process also covers how long the process took to get to it.
+    if not _startup_reported:
+        _startup_reported = True
+        output["startup"] = startup_probe.report(root["start_ns"], root["end_ns"])
+    print(json.dumps(output), file=sys.stderr)
+    if OTLP_FILE:
+        try:
+            with open(OTLP_FILE, "a") as f:
+                f.write(json.dumps(_otlp(trace)) + "\n")
+        except OSError as e:
+            print(f"Failed to write trace to {OTLP_FILE}: {e}", file=sys.stderr)
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp(trace):
+    spans = []
+    for record in trace.spans:
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 3 if record["name"].startswith("HTTP ") else 1,
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["end_ns"]),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in record["attributes"].items()],
+            "status": {"code": 1} if record["status"] == "ok" else {"code": 2, "message": record.get("error", "")},
+        }
+        if record["parent_id"]:
+            otlp_span["parentSpanId"] = record["parent_id"]
+        spans.append(otlp_span)
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "pd-tools"}}]},
+            "scopeSpans": [{"scope": {"name": "pd_tools.tracing"}, "spans": spans}],
+        }]
+    }
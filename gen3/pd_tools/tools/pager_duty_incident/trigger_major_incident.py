@@ -1,71 +1,87 @@
 #!/usr/bin/env python3
 
 import os
-import requests
 import json
 import argparse
-from datetime import datetime, time, timedelta
-
-def _get_or_raise_env_var(env_var):
-    value = os.getenv(env_var)
-    if value is None:
-        raise Exception(f"Env var {env_var} is not set")
-    return value
-
-def get_access_token():
-    AZURE_TENANT_ID = _get_or_raise_env_var("AZURE_TENANT_ID")
-    AZURE_CLIENT_ID = _get_or_raise_env_var("AZURE_CLIENT_ID")
-    AZURE_CLIENT_SECRET = _get_or_raise_env_var("AZURE_CLIENT_SECRET")
-    
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+try:
+    from . import circuit_breaker, deferred_actions, http_client, oncall_roster, slack_directory, token_cache, tool_config, tracing, workflow_journal
+    from .step_graph import Step, run_step_graph
+except ImportError:
+    import circuit_breaker
+    import deferred_actions
+    import http_client
+    import oncall_roster
+    import slack_directory
+    import token_cache
+    import tool_config
+    import tracing
+    import workflow_journal
+    from step_graph import Step, run_step_graph
+
+GRAPH_SCOPE = "https://graph.microsoft.com/.default"
+INCIDENT_COMMANDER_POLICY_ID = "PG2K3KC"
+SANDBOX_CLEANUP_DELAY_SECONDS = 60
+SANDBOX_TICKET_TAG = "kubi-sandbox-test"
+# End-to-end budget for the whole flow, of which the last ANNOUNCEMENT_RESERVE_SECONDS
+# are kept back from the other steps so the Slack announcement always has time to go out.
+MAJOR_INCIDENT_DEADLINE_SECONDS = float(os.getenv("MAJOR_INCIDENT_DEADLINE_SECONDS", 20))
+ANNOUNCEMENT_RESERVE_SECONDS = 4
+# How long past the deadline a run's journal lease is kept, for the last journal writes.
+JOURNAL_LEASE_GRACE_SECONDS = 10
+# Cap on each optional step, so a slow lookup costs the announcement at most this long.
+OPTIONAL_STEP_SECONDS = 3
+MEETING_ENDPOINT = "graph-online-meetings"
+# Create the Freshservice ticket alongside the PD incident instead of after it, and tag it
+# with the incident ID once the announcement is out. "0" restores the serial order.
+PIPELINE_TICKET_CREATION = os.getenv("MAJOR_INCIDENT_PIPELINE_TICKET", "1") != "0"
+
+def get_access_token(config):
+    AZURE_TENANT_ID = config.azure_tenant_id
+    AZURE_CLIENT_ID = config.azure_client_id
+    AZURE_CLIENT_SECRET = config.azure_client_secret
+
     url = f"https://login.microsoftonline.com/{AZURE_TENANT_ID}/oauth2/v2.0/token"
     payload = {
         "client_id": AZURE_CLIENT_ID,
-        "scope": "https://graph.microsoft.com/.default",
+        "scope": GRAPH_SCOPE,
         "client_secret": AZURE_CLIENT_SECRET,
         "grant_type": "client_credentials"
     }
-    response = requests.post(url, data=payload)
-    response.raise_for_status()
-    return response.json().get("access_token")
+
+    def fetch():
+        response = http_client.post(url, data=payload)
+        response.raise_for_status()
+        token = response.json()
+        return token.get("access_token"), token.get("expires_in", 3599)
+
+    # Client-credentials tokens live about an hour; reuse one across back-to-back incidents.
+    return token_cache.cached_token(AZURE_TENANT_ID, AZURE_CLIENT_ID, GRAPH_SCOPE, fetch)
+
+def bounded(seconds, func):
+    def run(**kwargs):
+        with http_client.deadline(seconds):
+            return func(**kwargs)
+    return run
 
 def get_oncall_engineer(escalation_policy_id):
-    PD_API_KEY = _get_or_raise_env_var("PD_API_KEY")
-    GET_ONCALL_ENGINEER_POLICY_ID = "PG2K3KC"
-    
-    url = f"https://api.pagerduty.com/oncalls?escalation_policy_ids[]={GET_ONCALL_ENGINEER_POLICY_ID}"
-    headers = {
-        "Authorization": f"Token token={PD_API_KEY}",
-        "Accept": "application/vnd.pagerduty+json;version=2"
-    }
-    response = requests.get(url, headers=headers)
-    response.raise_for_status()
-    oncalls = response.json().get("oncalls", [])
-    for oncall in oncalls:
-        if oncall.get("user"):
-            return oncall["user"]["summary"]
+    for oncall in oncall_roster.oncall_users(escalation_policy_id):
+        return oncall["summary"]
     return "Incident Commander"
 
-def create_pd_incident(description):
-    PD_API_KEY = _get_or_raise_env_var("PD_API_KEY")
-    KUBIYA_USER_EMAIL = _get_or_raise_env_var("KUBIYA_USER_EMAIL")
-    SERVICE_ID = _get_or_raise_env_var("PD_SERVICE_ID")
-    ESCALATION_POLICY_ID = _get_or_raise_env_var("PD_ESCALATION_POLICY_ID")
-    FSAPI_PROD = os.getenv("FSAPI_PROD")
-    FSAPI_SANDBOX = os.getenv("FSAPI_SANDBOX")
-    
+def create_pd_incident(config, description):
+    SERVICE_ID = config.pd_service_id
+    ESCALATION_POLICY_ID = config.pd_escalation_policy_id
+
     url = "https://api.pagerduty.com/incidents"
-    headers = {
-        "Authorization": f"Token token={PD_API_KEY}",
-        "Content-Type": "application/json",
-        "From": KUBIYA_USER_EMAIL
-    }
-    if FSAPI_PROD:
+    if config.production:
         title_prefix = "Major Incident via Kubi - "
-    elif FSAPI_SANDBOX:
-        title_prefix = "TEST TICKET.IGNORE.Major Incident via Kubi - "
     else:
-        raise Exception("Neither FSAPI_PROD nor FSAPI_SANDBOX is set")
-    
+        title_prefix = "TEST TICKET.IGNORE.Major Incident via Kubi - "
+
     payload = {
         "incident": {
             "type": "incident",
@@ -84,24 +100,12 @@ def create_pd_incident(description):
             }
         }
     }
-    print(f"Payload: {json.dumps(payload, indent=2)}")
-    print(f"Headers: {headers}")
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    print(f"Response Status Code: {response.status_code}")
-    print(f"Response Body: {response.text}")
+    response = http_client.post(url, json=payload)
     response.raise_for_status()
     return response.json()["incident"]["id"]
 
 def close_pd_incident(pd_incident_id):
-    KUBIYA_USER_EMAIL = _get_or_raise_env_var("KUBIYA_USER_EMAIL")
-    PD_API_KEY = _get_or_raise_env_var("PD_API_KEY")
-
     url = f"https://api.pagerduty.com/incidents/{pd_incident_id}"
-    headers = {
-        "Authorization": f"Token token={PD_API_KEY}",
-        "Content-Type": "application/json",
-        "From": KUBIYA_USER_EMAIL
-    }
     payload = {
         "incident": {
             "type": "incident",
@@ -109,31 +113,25 @@ def close_pd_incident(pd_incident_id):
         }
     }
     print(f"Closing Incident with ID: {pd_incident_id}")
-    print(f"Payload: {json.dumps(payload, indent=2)}")
-    print(f"Headers: {headers}")
-    response = requests.put(url, headers=headers, data=json.dumps(payload))
-    print(f"Response Status Code: {response.status_code}")
-    print(f"Response Body: {response.text}")
+    response = http_client.put(url, json=payload)
     response.raise_for_status()
     return response.json()["incident"]["id"]  
 
-def create_ticket(description, business_impact, incident_id, incident_commander):
-    KUBIYA_USER_EMAIL = _get_or_raise_env_var("KUBIYA_USER_EMAIL")
-    FSAPI_PROD = os.getenv("FSAPI_PROD")
-    FSAPI_SANDBOX = os.getenv("FSAPI_SANDBOX")
-    FSAPI = FSAPI_PROD if FSAPI_PROD else FSAPI_SANDBOX
-    
-    if not FSAPI:
-        raise Exception("Neither FSAPI_PROD nor FSAPI_SANDBOX is set")
-    
-    if FSAPI_PROD:
-        url = "https://aenetworks.freshservice.com/api/v2/tickets"
+def ticket_tags(config, incident_id):
+    tags = [f"PDID_{incident_id}"] if incident_id else []
+    if not config.production:
+        # Lets sandbox_cleanup find leftover test tickets with a server-side filter.
+        tags.append(SANDBOX_TICKET_TAG)
+    return tags
+
+def create_ticket(config, description, business_impact, incident_id, incident_commander):
+    url = f"{config.freshservice_url}/api/v2/tickets"
+    if config.production:
         subject = f"MAJOR INCIDENT pagerduty-kubiya-page-oncall-service - Major Incident via Kubi"
-    elif FSAPI_SANDBOX:
-        url = "https://aenetworks-fs-sandbox.freshservice.com/api/v2/tickets"
+    else:
         subject = f"TEST TICKET.IGNORE.MAJOR INCIDENT pagerduty-kubiya-page-oncall-service - Major Incident via Kubi"
-    
-    user_email = KUBIYA_USER_EMAIL
+
+    user_email = config.kubiya_user_email
     payload = {
         "description": f"{description}<br><strong>Incident Commander:</strong> {incident_commander}<br><strong>Detection Method:</strong> Detection Method<br><strong>Business Impact:</strong> {business_impact}<br><strong>Ticket Link:</strong>PagerDuty Incident",
         "subject": subject,
@@ -143,24 +141,19 @@ def create_ticket(description, business_impact, incident_id, incident_commander)
         "source": 8,
         "category": "DevOps",
         "sub_category": "Pageout",
-        "tags": [f"PDID_{incident_id}"]
+        "tags": ticket_tags(config, incident_id)
     }
-    response = requests.post(url, headers={"Content-Type": "application/json"}, auth=(FSAPI, "X"), data=json.dumps(payload))
+    response = http_client.post(url, json=payload)
     response.raise_for_status()
     return response.json()["ticket"]["id"]
 
-def close_ticket(ticket_id):
-    FSAPI_PROD = os.getenv("FSAPI_PROD")
-    FSAPI_SANDBOX = os.getenv("FSAPI_SANDBOX")
-    FSAPI = FSAPI_PROD if FSAPI_PROD else FSAPI_SANDBOX
-
-    if not FSAPI:
-        raise Exception("Neither FSAPI_PROD nor FSAPI_SANDBOX is set")
+def link_ticket(config, ticket_id, incident_id):
+    url = f"{config.freshservice_url}/api/v2/tickets/{ticket_id}"
+    response = http_client.put(url, json={"tags": ticket_tags(config, incident_id)})
+    response.raise_for_status()
 
-    if FSAPI_PROD:
-        url = f"https://aenetworks.freshservice.com/api/v2/tickets{ticket_id}"
-    elif FSAPI_SANDBOX:   
-        url = f"https://aenetworks-fs-sandbox.freshservice.com/api/v2/tickets{ticket_id}"
+def close_ticket(config, ticket_id):
+    url = f"{config.freshservice_url}/api/v2/tickets/{ticket_id}"
 
     payload = {
         "status": 4,    
@@ -171,10 +164,7 @@ def close_ticket(ticket_id):
          }
     }
 
-    response = requests.put(url, headers={"Content-Type": "application/json"}, auth=(FSAPI, "X"), data=json.dumps(payload))
-    
-    print(f"Response status code: {response.status_code}")
-    print(f"Response content: {response.text}")
+    response = http_client.put(url, json=payload)
 
     if response.status_code == 200:
         try:
@@ -186,126 +176,222 @@ def close_ticket(ticket_id):
         print(f"Failed to update ticket {ticket_id}. Status code: {response.status_code}")
         return None
 
-def create_meeting(access_token):
-    url = "https://graph.microsoft.com/v1.0/users/d69debf1-af1f-493f-8837-35747e55ea0f/onlineMeetings"
+def discard_ticket(config, journal):
+    ticket_id = journal.get("ticket_id")
+    print(f"Closing ticket {ticket_id}, as its PagerDuty incident was not created")
+    try:
+        closed = close_ticket(config, ticket_id)
+    except Exception as e:
+        print(f"Failed to close ticket {ticket_id}: {e}")
+        closed = None
+    if closed is None:
+        if config.production:
+            print(f"Ticket {ticket_id} is still open and must be closed by hand")
+        else:
+            deferred_actions.schedule("close_ticket", [ticket_id], 0)
+    # A retry opens a new ticket along with its incident.
+    journal.forget("ticket_id")
+
+def create_meeting(access_token, external_id):
+    # createOrGet returns the same meeting for the same externalId, so a hedged retry can't create a second one.
+    url = "https://graph.microsoft.com/v1.0/users/d69debf1-af1f-493f-8837-35747e55ea0f/onlineMeetings/createOrGet"
     start_time = datetime.utcnow()
     end_time = start_time + timedelta(hours=1)
     payload = {
         "startDateTime": start_time.isoformat() + "Z",
-        "endDateTime": end_time.isoformat() + "Z"
+        "endDateTime": end_time.isoformat() + "Z",
+        "externalId": external_id,
+        "subject": "Major Incident Bridge"
     }
     headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json"
+        "Authorization": f"Bearer {access_token}"
     }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = http_client.post(url, headers=headers, json=payload)
     response.raise_for_status()
     return response.json()["joinUrl"]
 
-def get_slack_user_id(email):
-    SLACK_API_TOKEN = _get_or_raise_env_var("SLACK_API_TOKEN")
-    
-    url = "https://slack.com/api/users.lookupByEmail"
-    headers = {
-        "Authorization": f"Bearer {SLACK_API_TOKEN}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    params = {"email": email}
-    response = requests.get(url, headers=headers, params=params)
-    response_data = response.json()
+def create_bridge(config):
+    with tracing.span("step meeting_link"):
+        import uuid  # Pulls in platform; only a run that still needs a meeting pays for it.
+        access_token = get_access_token(config)
+        external_id = str(uuid.uuid4())
+        return circuit_breaker.call(MEETING_ENDPOINT, lambda: create_meeting(access_token, external_id))
 
-    if response_data["ok"]:
-        return response_data["user"]["id"]
-    else:
-        print(f"Error fetching user ID for {email}: {response_data['error']}")
-        return None
+def get_slack_user_id(email):
+    return slack_directory.lookup_user_id(email)
 
-def send_slack_message(channel, message):
-    SLACK_API_TOKEN = _get_or_raise_env_var("SLACK_API_TOKEN")
-    
+def send_slack_message(channel, message, thread_ts=None):
     url = "https://slack.com/api/chat.postMessage"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {SLACK_API_TOKEN}"
-    }
     payload = {
         "channel": channel,
         "text": message
     }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    if thread_ts:
+        payload["thread_ts"] = thread_ts
+    response = http_client.post(url, json=payload)
     response.raise_for_status()
+    return response.json().get("ts")
 
-def main():
-    parser = argparse.ArgumentParser(description="Trigger a major incident communication")
-    parser.add_argument("--description", required=True, help="The description of the incident")
-    parser.add_argument("--business_impact", required=True, help="The business impact of the incident")
-    args = parser.parse_args()
-
-    description = args.description
-    business_impact = args.business_impact
-        
-    FSAPI_PROD = os.getenv("FSAPI_PROD")
-    FSAPI_SANDBOX = os.getenv("FSAPI_SANDBOX")
-
-    reporter = _get_or_raise_env_var("KUBIYA_USER_EMAIL")
-    access_token = get_access_token()
-    escalation_policy_id = _get_or_raise_env_var("PD_ESCALATION_POLICY_ID")
-    incident_commander = get_oncall_engineer(escalation_policy_id)
-    pd_incident_id = create_pd_incident(description)
-    ticket_id = create_ticket(description, business_impact, pd_incident_id, incident_commander)
-
-    if FSAPI_PROD:
-        ticket_url = f"https://aenetworks.freshservice.com/a/tickets/{ticket_id}"
-    elif FSAPI_SANDBOX:
-        ticket_url = f"https://aenetworks-fs-sandbox.freshservice.com/a/tickets/{ticket_id}"
-
-    meeting_link = create_meeting(access_token)
-    
-    # Fetch Slack user ID for the reporter
-    print(f"Fetching Slack user ID for email: {reporter}")
-    reporter_user_id = get_slack_user_id(reporter)
-    reporter_mention = f"<@{reporter_user_id}>" if reporter_user_id else reporter
-
-    # Channel ID for #incident_response (replace with actual ID)
-    channel_id = _get_or_raise_env_var("INCIDENT_RESPONSE_CHANNEL_ID")
-
-    if FSAPI_PROD:
-        message = (
+def build_announcement(config, description, business_impact, incident_commander, pd_incident_id, ticket_url, bridge_link, reporter_mention):
+    if config.production:
+        header = (
             "************** SEV 1 ****************\n"
             "<@U04JCDSHS76> <@U04J2MTMRFD> <@U04FZPQSY3H> <@U048QRBV2NA> <@U04UKPX585S> <@U02SSCGCQQ6>\n"
-            f"Incident Commander: {incident_commander}\n"
-            f"Description: {description}\n"
-            f"Business Impact: {business_impact}\n"
-            f"Bridge Link: <{meeting_link}|Bridge Link>\n"
-            f"PagerDuty Incident URL: https://aetnd.pagerduty.com/incidents/{pd_incident_id}\n"
-            f"FS Ticket URL: {ticket_url}\n"
-            f"Reported by: {reporter_mention}\n"
-            "We will keep everyone posted on this channel as we assess the issue further."
         )
-    elif FSAPI_SANDBOX:
-        message = (
+    else:
+        header = (
             "************** THIS IS A TEST -- DISREGARD ****************\n"
             "@Jeff McGrath @Kevin Keeler @Tapan Shah @Neeraj Mendiratta @John Dispirito @Sebastian Marjanovic\n"
-            f"Incident Commander: {incident_commander}\n"
-            f"Description: {description}\n"
-            f"Business Impact: {business_impact}\n"
-            f"Bridge Link: <{meeting_link}|Bridge Link>\n"
-            f"PagerDuty Incident URL: https://aetnd.pagerduty.com/incidents/{pd_incident_id}\n"
-            f"FS Ticket URL: {ticket_url}\n"
-            f"Reported by: {reporter_mention}\n"
-            "We will keep everyone posted on this channel as we assess the issue further."
         )
-    send_slack_message(channel_id, message.strip())
+    return (
+        header +
+        f"Incident Commander: {incident_commander}\n"
+        f"Description: {description}\n"
+        f"Business Impact: {business_impact}\n"
+        f"Bridge Link: {bridge_link}\n"
+        f"PagerDuty Incident URL: https://aetnd.pagerduty.com/incidents/{pd_incident_id}\n"
+        f"FS Ticket URL: {ticket_url}\n"
+        f"Reported by: {reporter_mention}\n"
+        "We will keep everyone posted on this channel as we assess the issue further."
+    )
+
+def run_major_incident(config, description, business_impact, journal):
+    reporter = config.kubiya_user_email
+    standing_bridge_url = config.standing_bridge_url
+    # Channel ID for #incident_response (replace with actual ID)
+    channel_id = config.incident_response_channel_id
+
+    if journal.steps:
+        print(f"Resuming the earlier attempt of this major incident after: {', '.join(journal.steps)}")
+    print(f"Fetching Slack user ID for email: {reporter}")
+
+    # Independent calls run side by side; the announcement waits only for the longest chain.
+    # Optional steps fall back to a default rather than holding up or failing the announcement.
+    # The Teams meeting holds it up for at most Graph's p95 latency: if it isn't ready by then,
+    # or Graph's breaker is open, the standing bridge is announced and the meeting link
+    # follows in the thread.
+    # Each step's output is journaled, so a retry skips whatever an earlier attempt finished.
+    meeting_executor = ThreadPoolExecutor(max_workers=1)
+    meeting = None
+    try:
+        with http_client.reserve(ANNOUNCEMENT_RESERVE_SECONDS):
+            if "meeting_link" not in journal:
+                if circuit_breaker.is_open(MEETING_ENDPOINT):
+                    print("Teams meeting creation is failing, announcing the standing bridge")
+                else:
+                    meeting = meeting_executor.submit(contextvars.copy_context().run, journal.step("meeting_link", lambda: create_bridge(config)))
+            if PIPELINE_TICKET_CREATION:
+                ticket_step = Step(
+                    "ticket_id",
+                    journal.step("ticket_id", lambda incident_commander: create_ticket(config, description, business_impact, None, incident_commander)),
+                    deps=["incident_commander"],
+                )
+            else:
+                ticket_step = Step(
+                    "ticket_id",
+                    journal.step("ticket_id", lambda pd_incident_id, incident_commander: create_ticket(config, description, business_impact, pd_incident_id, incident_commander)),
+                    deps=["pd_incident_id", "incident_commander"],
+                )
+            results = run_step_graph([
+                Step(
+                    "incident_commander",
+                    bounded(OPTIONAL_STEP_SECONDS, journal.step("incident_commander", lambda: get_oncall_engineer(INCIDENT_COMMANDER_POLICY_ID))),
+                    optional=True,
+                    default="Incident Commander",
+                ),
+                Step("pd_incident_id", journal.step("pd_incident_id", lambda: create_pd_incident(config, description))),
+                ticket_step,
+                Step("reporter_user_id", bounded(OPTIONAL_STEP_SECONDS, journal.step("reporter_user_id", lambda: get_slack_user_id(reporter))), optional=True),
+            ])
+    except Exception:
+        # A pipelined ticket is created whether or not the PD incident is; with no incident
+        # to link it to, close it rather than leave it open and untagged.
+        if "ticket_id" in journal and "pd_incident_id" not in journal:
+            discard_ticket(config, journal)
+        raise
+    pd_incident_id = results["pd_incident_id"]
+    ticket_id = results["ticket_id"]
+    meeting_link = journal.get("meeting_link")
+    if meeting:
+        # Never into the time kept back for the announcement.
+        timeout = circuit_breaker.hedge_delay(MEETING_ENDPOINT)
+        if http_client.remaining() is not None:
+            timeout = max(0, min(timeout, http_client.remaining() - ANNOUNCEMENT_RESERVE_SECONDS))
+        wait([meeting], timeout=timeout)
+        if meeting.done() and not meeting.exception():
+            meeting_link = meeting.result()
+
+    announcement = journal.get("announcement")
+    if announcement:
+        print("The SEV1 announcement was already posted by an earlier attempt")
+    else:
+        ticket_url = f"{config.freshservice_url}/a/tickets/{ticket_id}"
+        reporter_user_id = results["reporter_user_id"]
+        reporter_mention = f"<@{reporter_user_id}>" if reporter_user_id else reporter
+        bridge_link = f"<{meeting_link or standing_bridge_url}|Bridge Link>"
+
+        message = build_announcement(config, description, business_impact, results["incident_commander"], pd_incident_id, ticket_url, bridge_link, reporter_mention)
+        with tracing.span("step announcement"):
+            announcement = {"ts": send_slack_message(channel_id, message), "meeting_link": meeting_link}
+        journal.record("announcement", announcement)
 
-    channel_name = _get_or_raise_env_var("INCIDENT_RESPONSE_CHANNEL_NAME")
+    if PIPELINE_TICKET_CREATION and "ticket_linked" not in journal:
+        try:
+            with tracing.span("step ticket_link"):
+                link_ticket(config, ticket_id, pd_incident_id)
+            journal.record("ticket_linked", True)
+        except Exception as e:
+            print(f"Failed to tag ticket {ticket_id} with PagerDuty incident {pd_incident_id}: {e}")
+            print("Run this major incident again with the same details to link them; it resumes rather than raising a new incident.")
+
+    if not announcement["meeting_link"] and "meeting_link_update" not in journal and (meeting or meeting_link):
+        # The meeting's requests run under the reserved deadline, so this leaves time to post.
+        try:
+            meeting_link = meeting_link or meeting.result()
+            with tracing.span("step meeting_link_update"):
+                send_slack_message(channel_id, f"Teams meeting for this incident: <{meeting_link}|Bridge Link>", thread_ts=announcement["ts"])
+            journal.record("meeting_link_update", True)
+        except Exception as e:
+            print(f"Failed to post the Teams meeting link: {e}")
+    meeting_executor.shutdown()
+
+    channel_name = config.incident_response_channel_name
     print(f"Please go to the <#{channel_id}|{channel_name}> channel to find the SEV1 announcement. The bridge line and pertinent details have been posted there. Thank you.")
     
-    if FSAPI_SANDBOX:
-        time.sleep(60)
-        close_pd_incident(pd_incident_id)
-        close_ticket(ticket_id)
+    if not config.production:
+        # Closed later by sandbox_cleanup.py rather than holding this container idle.
+        if "cleanup_scheduled" not in journal:
+            deferred_actions.schedule("close_pd_incident", [pd_incident_id], SANDBOX_CLEANUP_DELAY_SECONDS)
+            deferred_actions.schedule("close_ticket", [ticket_id], SANDBOX_CLEANUP_DELAY_SECONDS)
+            journal.record("cleanup_scheduled", True)
+        print(f"The test incident and ticket are queued for the sandbox-cleanup-worker, which closes them once they are {SANDBOX_CLEANUP_DELAY_SECONDS} seconds old.")
     else:
         print("This is a production environment, so we will not close the incident or ticket.")
+    # Left unfinished while the ticket isn't linked, so a retry with the derived key resumes
+    # it and links the two rather than raising a new incident. The deferred-actions worker
+    # runs only in the sandbox, so it can't backfill the link.
+    if not PIPELINE_TICKET_CREATION or "ticket_linked" in journal:
+        journal.complete()
+
+def main():
+    parser = argparse.ArgumentParser(description="Trigger a major incident communication")
+    parser.add_argument("--description", required=True, help="The description of the incident")
+    parser.add_argument("--business_impact", required=True, help="The business impact of the incident")
+    parser.add_argument("--idempotency_key", default="", help="Retries with the same key resume the earlier attempt, even a completed one (default: derived from the reporter, description and business impact, resuming only an unfinished attempt)")
+    args = parser.parse_args()
+
+    # Before anything is created, so a misconfigured run leaves nothing behind.
+    config = tool_config.load("trigger_major_incident")
+    key = args.idempotency_key or workflow_journal.idempotency_key(config.kubiya_user_email, args.description, args.business_impact)
+    # A derived key only resumes an attempt that didn't finish: the same report again later is a new incident.
+    # The deadline also bounds the journal's lock waits; the lease outlasts it, so it only
+    # lapses for an attempt that died without releasing it.
+    with tracing.trace("trigger_major_incident", idempotency_key=key), http_client.deadline(MAJOR_INCIDENT_DEADLINE_SECONDS):
+        try:
+            with workflow_journal.journal(key, MAJOR_INCIDENT_DEADLINE_SECONDS + JOURNAL_LEASE_GRACE_SECONDS, resume_completed=bool(args.idempotency_key)) as journal:
+                run_major_incident(config, args.description, args.business_impact, journal)
+        except workflow_journal.RunInFlight:
+            print("This major incident is already being raised by another attempt; its SEV1 announcement will follow shortly.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
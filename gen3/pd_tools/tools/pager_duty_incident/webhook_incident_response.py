@@ -1,20 +1,31 @@
 #!/usr/bin/env python3
 
 import os
-import requests
-import json
 import argparse
-
-def _get_or_raise_env_var(env_var):
-    value = os.getenv(env_var)
-    if value is None:
-        raise Exception(f"Env var {env_var} is not set")
-    return value
+from typing import NamedTuple
+
+try:
+    from . import delivery_dedup, http_client, slack_directory, tool_config, tracing
+except ImportError:
+    import delivery_dedup
+    import http_client
+    import slack_directory
+    import tool_config
+    import tracing
+
+# End-to-end budget for one webhook, with the last ANNOUNCEMENT_RESERVE_SECONDS kept for the
+# Slack post and a short cap on the optional reporter lookup.
+WEBHOOK_DEADLINE_SECONDS = float(os.getenv("WEBHOOK_DEADLINE_SECONDS", 20))
+ANNOUNCEMENT_RESERVE_SECONDS = 4
+REPORTER_LOOKUP_SECONDS = 3
+
+class TicketResult(NamedTuple):
+    ticket_id: int
+    status: int
 
 # Function to create a service ticket
-def create_ticket(description, servicename, title, incident_url, slackincidentcommander, slackdetectionmethod, slackbusinessimpact, incident_id):
-    FSAPI_PROD = _get_or_raise_env_var('FSAPI_PROD')
-    url = "https://aenetworks.freshservice.com/api/v2/tickets"
+def create_ticket(config, description, servicename, title, incident_url, slackincidentcommander, slackdetectionmethod, slackbusinessimpact, incident_id):
+    url = f"{config.freshservice_url}/api/v2/tickets"
     payload = {
         "description": f"{description}</br><strong>Incident Commander:</strong>{slackincidentcommander}</br><strong>Detection Method:</strong>{slackdetectionmethod}</br><strong>Business Impact:</strong>{slackbusinessimpact}</br><strong>Ticket Link:</strong>{incident_url}",
         "subject": f"TESTING {servicename} - {title}",
@@ -26,48 +37,87 @@ def create_ticket(description, servicename, title, incident_url, slackincidentco
         "sub_category": "Pageout",
         "tags": [f"PDID_{incident_id}"]
     }
-    headers = {
-        "Content-Type": "application/json"
-    }
-    response = requests.post(url, auth=(FSAPI_PROD, 'X'), headers=headers, json=payload)
-    with open('response.json', 'w') as f:
-        f.write(response.text)
-
-# Function to extract ticket ID from response
-def extract_ticket_id():
-    with open('response.json', 'r') as f:
-        response = json.load(f)
-    return response.get('ticket', {}).get('id', '')
+    response = http_client.post(url, json=payload)
+    try:
+        response.raise_for_status()
+    except http_client.HTTPError as e:
+        raise Exception(f"Failed to create ticket: {e}: {response.text}")
+
+    try:
+        ticket = response.json()["ticket"]
+        return TicketResult(ticket_id=ticket["id"], status=ticket["status"])
+    except Exception as e:
+        raise Exception(f"Failed to fetch ticket id: {e}")
 
 # Function to fetch Slack User ID by email
 def get_slack_user_id(email):
-    SLACK_API_TOKEN = _get_or_raise_env_var('SLACK_API_TOKEN')
-    url = "https://slack.com/api/users.lookupByEmail"
-    headers = {
-        "Authorization": f"Bearer {SLACK_API_TOKEN}"
-    }
-    params = {
-        "email": email
-    }
-    response = requests.get(url, headers=headers, params=params)
-    user_id = response.json().get('user', {}).get('id', '')
-    return user_id if user_id != "null" else ""
+    return slack_directory.lookup_user_id(email) or ""
 
 def send_slack_message(channel, message):
-    SLACK_API_TOKEN = _get_or_raise_env_var("SLACK_API_TOKEN")
-    
     url = "https://slack.com/api/chat.postMessage"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {SLACK_API_TOKEN}"
-    }
     payload = {
         "channel": channel,
         "text": message
     }
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
+    response = http_client.post(url, json=payload)
     response.raise_for_status()
 
+# Ticket + Slack announcement flow, shared by the CLI and webhook_server.py
+def respond_to_incident(config, description, servicename, title, incident_url, slackincidentcommander, slackdetectionmethod, slackbusinessimpact, incident_id, bridge_url, reporter_email, delivery_key=None):
+    """Run the flow once per incident. `delivery_key` is the caller's own claim on this delivery, released with the incident's on failure."""
+    # PagerDuty redelivers webhooks; only the first delivery for an incident gets a ticket and an announcement.
+    if not delivery_dedup.claim(f"incident:{incident_id}"):
+        print(f"Incident {incident_id} has already been handled, skipping this delivery")
+        return
+    try:
+        _respond_to_incident(config, description, servicename, title, incident_url, slackincidentcommander, slackdetectionmethod, slackbusinessimpact, incident_id, bridge_url, reporter_email)
+    except Exception:
+        # Let a later delivery try again.
+        delivery_dedup.release(f"incident:{incident_id}")
+        if delivery_key:
+            delivery_dedup.release(delivery_key)
+        raise
+
+def _respond_to_incident(config, description, servicename, title, incident_url, slackincidentcommander, slackdetectionmethod, slackbusinessimpact, incident_id, bridge_url, reporter_email):
+    with tracing.trace("webhook_incident_response", incident_id=incident_id), http_client.deadline(WEBHOOK_DEADLINE_SECONDS):
+        # Fetch Slack User ID for the reporter; the announcement falls back to the email if this is slow
+        try:
+            with tracing.span("step reporter_user_id"), http_client.deadline(REPORTER_LOOKUP_SECONDS):
+                reporter_user_id = get_slack_user_id(reporter_email)
+        except Exception as e:
+            print(f"Failed to fetch Slack user ID for {reporter_email}: {e}")
+            reporter_user_id = ""
+
+        # Create service ticket
+        with tracing.span("step ticket"), http_client.reserve(ANNOUNCEMENT_RESERVE_SECONDS):
+            ticket = create_ticket(config, description, servicename, title, incident_url, slackincidentcommander, slackdetectionmethod, slackbusinessimpact, incident_id)
+
+        # Generate ticket URL
+        TICKET_URL = f"{config.freshservice_url}/a/tickets/{ticket.ticket_id}"
+
+        # Slack channel ID for #incident_response
+        channel_id = "CAZ6ZGBJ7"  # Replace with the actual channel ID for #incident_response
+
+        # Generate the Slack message with channel and reporter tagging
+        reporter_tag = f"<@{reporter_user_id}>" if reporter_user_id else reporter_email
+
+        MESSAGE = f"""
+        ************** SEV 1 ****************
+        <@U04JCDSHS76> <@U04J2MTMRFD> <@U04FZPQSY3H> <@U048QRBV2NA> <@U04UKPX585S> <@U02SSCGCQQ6>
+        Incident Commander: {slackincidentcommander}
+        Detection Method: {slackdetectionmethod}
+        Business Impact: {slackbusinessimpact}
+        Bridge Link: <{bridge_url}|Bridge Link>
+        Pagerduty Incident URL: {incident_url}
+        FS Ticket URL: {TICKET_URL}
+        Reported by: {reporter_tag}
+        We will keep everyone posted on this channel as we assess the issue further.
+        """
+
+        # Send the message to the Slack channel using the Slack API
+        with tracing.span("step announcement"):
+            send_slack_message(channel_id, MESSAGE)
+
 def main():
     parser = argparse.ArgumentParser(description="Process incident details.")
     parser.add_argument('--description', required=True, help='The description of the incident')
@@ -83,39 +133,8 @@ def main():
 
     args = parser.parse_args()
 
-    # Fetch Slack User ID for the reporter
-    reporter_user_id = get_slack_user_id(args.reporter_email)
-
-    # Create service ticket
-    create_ticket(args.description, args.servicename, args.title, args.incident_url, args.slackincidentcommander, args.slackdetectionmethod, args.slackbusinessimpact, args.incident_id)
-
-    # Extract ticket ID
-    TICKET_ID = extract_ticket_id()
-
-    # Generate ticket URL
-    TICKET_URL = f"https://aenetworks.freshservice.com/a/tickets/{TICKET_ID}"
-
-    # Slack channel ID for #incident_response
-    channel_id = "CAZ6ZGBJ7"  # Replace with the actual channel ID for #incident_response
-
-    # Generate the Slack message with channel and reporter tagging
-    reporter_tag = f"<@{reporter_user_id}>" if reporter_user_id else args.reporter_email
-
-    MESSAGE = f"""
-    ************** SEV 1 ****************
-    <@U04JCDSHS76> <@U04J2MTMRFD> <@U04FZPQSY3H> <@U048QRBV2NA> <@U04UKPX585S> <@U02SSCGCQQ6>
-    Incident Commander: {args.slackincidentcommander}
-    Detection Method: {args.slackdetectionmethod}
-    Business Impact: {args.slackbusinessimpact}
-    Bridge Link: <{args.bridge_url}|Bridge Link>
-    Pagerduty Incident URL: {args.incident_url}
-    FS Ticket URL: {TICKET_URL}
-    Reported by: {reporter_tag}
-    We will keep everyone posted on this channel as we assess the issue further.
-    """
-
-    # Send the message to the Slack channel using the Slack API
-    send_slack_message(channel_id, MESSAGE)
+    config = tool_config.load("webhook_incident_response")
+    respond_to_incident(config, args.description, args.servicename, args.title, args.incident_url, args.slackincidentcommander, args.slackdetectionmethod, args.slackbusinessimpact, args.incident_id, args.bridge_url, args.reporter_email)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import queue
+import signal
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    from . import delivery_dedup, metrics, oncall_roster, slack_directory, tool_config, webhook_incident_response
+except ImportError:
+    import delivery_dedup
+    import metrics
+    import oncall_roster
+    import slack_directory
+    import tool_config
+    import webhook_incident_response
+
+def _delivery_key(event, body):
+    return f"event:{event.get('id') or hashlib.sha256(body).hexdigest()}"
+
+# Largest request body read before the signature is checked. PagerDuty v3 deliveries
+# are a few KB; anything over this gets 413 without being read.
+MAX_BODY_BYTES = int(os.getenv("WEBHOOK_MAX_BODY_BYTES", 1024 * 1024))
+# PagerDuty doesn't redeliver an event it got a 2xx for, so a failed flow is retried here,
+# after RETRY_BACKOFF_SECONDS, then twice that, and so on, up to MAX_EVENT_ATTEMPTS runs.
+MAX_EVENT_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_EVENT_ATTEMPTS", 4))
+RETRY_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_RETRY_BACKOFF_SECONDS", 5))
+
+def _get_or_raise_env_var(env_var):
+    value = os.getenv(env_var)
+    if value is None:
+        raise Exception(f"Env var {env_var} is not set")
+    return value
+
+def verify_signature(secret, body, signature_header):
+    """Check a PagerDuty v3 `X-PagerDuty-Signature` header (one or more `v1=<hex hmac-sha256>`)."""
+    expected = hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+    for signature in (signature_header or "").split(","):
+        version, _, digest = signature.strip().partition("=")
+        if version == "v1" and hmac.compare_digest(digest, expected):
+            return True
+    return False
+
+def incident_from_event(event, reporter_email, standing_bridge_url):
+    """Map a v3 incident event onto the arguments of respond_to_incident."""
+    incident = event["data"]
+    assignees = incident.get("assignees") or []
+    bridge = incident.get("conference_bridge") or {}
+    return {
+        "description": incident.get("title", ""),
+        "servicename": (incident.get("service") or {}).get("summary", ""),
+        "title": incident.get("title", ""),
+        "incident_url": incident.get("html_url", ""),
+        "slackincidentcommander": assignees[0]["summary"] if assignees else "Incident Commander",
+        "slackdetectionmethod": "PagerDuty",
+        "slackbusinessimpact": (incident.get("priority") or {}).get("summary", "See PagerDuty incident"),
+        "incident_id": incident["id"],
+        "bridge_url": bridge.get("conference_url") or standing_bridge_url,
+        "reporter_email": reporter_email,
+    }
+
+class WebhookReceiver:
+    """Validates webhooks on the HTTP threads and runs the incident flow on a bounded worker pool.
+
+    An event whose flow fails is retried with backoff; once it gives up, or stops, the
+    event's claim is released so a redelivery is processed again.
+    """
+
+    def __init__(self, config, secret, event_types, workers, queue_size, reporter_email):
+        self.config = config
+        self.secret = secret
+        self.event_types = set(event_types)
+        self.reporter_email = reporter_email
+        self.events = queue.Queue(maxsize=queue_size)
+        self.workers = [threading.Thread(target=self._work, daemon=True) for _ in range(workers)]
+        self.retries = set()
+        self.retries_lock = threading.Lock()
+
+    def start(self):
+        for worker in self.workers:
+            worker.start()
+
+    def stop(self):
+        with self.retries_lock:
+            retries, self.retries = self.retries, set()
+        for retry in retries:
+            retry.cancel()
+        for _ in self.workers:
+            self.events.put(None)
+        for worker in self.workers:
+            worker.join()
+
+    def accept(self, body, signature_header):
+        """Return the HTTP status for a delivery: 202 queued, 200 ignored or redelivered, 4xx rejected, 503 full."""
+        if not verify_signature(self.secret, body, signature_header):
+            return 401
+        try:
+            event = json.loads(body)["event"]
+        except (ValueError, KeyError, TypeError):
+            return 400
+        if event.get("event_type") not in self.event_types:
+            return 200
+        # Acknowledge redeliveries of an event already accepted without doing any work.
+        delivery_key = _delivery_key(event, body)
+        if not delivery_dedup.claim(delivery_key):
+            return 200
+        try:
+            self.events.put_nowait((event, delivery_key, 1))
+        except queue.Full:
+            delivery_dedup.release(delivery_key)
+            return 503
+        return 202
+
+    def _work(self):
+        while True:
+            item = self.events.get()
+            if item is None:
+                return
+            event, delivery_key, attempt = item
+            try:
+                incident = incident_from_event(event, self.reporter_email, self.config.standing_bridge_url or "")
+                webhook_incident_response.respond_to_incident(self.config, **incident, delivery_key=delivery_key)
+                print(f"Processed {event.get('event_type')} {event.get('id')} for incident {incident['incident_id']}")
+            except Exception as e:
+                # Already released by respond_to_incident, unless the event failed before it ran.
+                delivery_dedup.release(delivery_key)
+                if attempt < MAX_EVENT_ATTEMPTS:
+                    delay = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                    print(f"Failed to process webhook event {event.get('id')} (attempt {attempt}), retrying in {delay:g}s: {e}")
+                    self._retry_later(delay, event, delivery_key, attempt + 1)
+                else:
+                    print(f"Giving up on webhook event {event.get('id')} after {attempt} attempts: {e}")
+            # The server runs indefinitely, so export each event's calls rather than only at exit.
+            metrics.flush()
+
+    def _retry_later(self, delay, event, delivery_key, attempt):
+        def retry():
+            with self.retries_lock:
+                if timer not in self.retries:
+                    return
+                self.retries.discard(timer)
+            # A redelivery that arrived in the meantime has claimed the event and handles it instead.
+            if not delivery_dedup.claim(delivery_key):
+                return
+            try:
+                self.events.put_nowait((event, delivery_key, attempt))
+            except queue.Full:
+                delivery_dedup.release(delivery_key)
+                print(f"Dropped the retry of webhook event {event.get('id')}: the queue is full")
+
+        timer = threading.Timer(delay, retry)
+        timer.daemon = True
+        with self.retries_lock:
+            self.retries.add(timer)
+        timer.start()
+
+def _refresh_directory(stop):
+    # A few users.list pages at a time, off the incident path, while a pass is due.
+    while not stop.is_set():
+        try:
+            if slack_directory.refresh_due():
+                slack_directory.refresh_directory()
+        except Exception as e:
+            print(f"Failed to refresh the Slack directory: {e}")
+        stop.wait(slack_directory.REFRESH_INTERVAL_SECONDS)
+
+def _refresh_roster(stop):
+    # The full on-call sweep, off the incident path, so lookups only ever fetch their own policy.
+    while not stop.is_set():
+        try:
+            if oncall_roster.refresh_due():
+                oncall_roster.refresh_roster()
+        except Exception as e:
+            print(f"Failed to refresh the on-call roster: {e}")
+        stop.wait(oncall_roster.REFRESH_INTERVAL_SECONDS)
+
+def _handler_for(receiver):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if not 0 <= length <= MAX_BODY_BYTES:
+                # The unread body would be parsed as the next request, so drop the connection.
+                self.close_connection = True
+                self.send_response(413 if length > MAX_BODY_BYTES else 400)
+                self.send_header("Connection", "close")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = self.rfile.read(length)
+            status = receiver.accept(body, self.headers.get("X-PagerDuty-Signature"))
+            self.send_response(status)
+            if status == 503:
+                self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Receive PagerDuty v3 webhooks and run the incident response flow.")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=8, help="Concurrent incident flows")
+    parser.add_argument("--queue_size", type=int, default=256, help="Accepted events waiting for a worker before deliveries get 503")
+    parser.add_argument("--event_types", default="incident.triggered", help="Comma-separated event types that start the flow")
+    args = parser.parse_args()
+
+    # Checked up front, rather than by the first incident to arrive.
+    config = tool_config.load("webhook_server")
+    receiver = WebhookReceiver(
+        config=config,
+        secret=_get_or_raise_env_var("PD_WEBHOOK_SECRET"),
+        event_types=args.event_types.split(","),
+        workers=args.workers,
+        queue_size=args.queue_size,
+        reporter_email=os.getenv("WEBHOOK_REPORTER_EMAIL", "devsecops@aenetworks.com"),
+    )
+    receiver.start()
+    stop = threading.Event()
+    threading.Thread(target=_refresh_directory, args=(stop,), daemon=True).start()
+    threading.Thread(target=_refresh_roster, args=(stop,), daemon=True).start()
+
+    server = ThreadingHTTPServer((args.host, args.port), _handler_for(receiver))
+    signal.signal(signal.SIGTERM, lambda *_: threading.Thread(target=server.shutdown).start())
+    print(f"Listening for PagerDuty webhooks on {args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        receiver.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    from . import state_store
+except ImportError:
+    import state_store
+
+# Re-running a workflow with the same key within this window resumes the earlier run if it
+# didn't complete (or, for an explicit key, even if it did); after it a new run starts from scratch.
+JOURNAL_TTL_SECONDS = int(os.getenv("PD_TOOLS_JOURNAL_TTL_SECONDS", 3600))
+
+_STORE_NAME = "workflow-journal"
+
+def idempotency_key(*parts):
+    return hashlib.sha256("|".join(str(part) for part in parts).encode("utf-8")).hexdigest()[:32]
+
+class Journal:
+    """The outputs of a workflow run's completed steps, persisted as each step completes."""
+
+    def __init__(self, key, steps):
+        self.key = key
+        self.steps = steps
+
+    def __contains__(self, step):
+        return step in self.steps
+
+    def get(self, step, default=None):
+        return self.steps.get(step, default)
+
+    def record(self, step, value):
+        with state_store.locked_json(_STORE_NAME) as journals:
+            entry = journals.setdefault(self.key, {"started_at": time.time(), "steps": {}})
+            entry["steps"][step] = value
+        self.steps[step] = value
+
+    def complete(self):
+        """Mark the run finished, so that only an explicit retry of its key resumes it."""
+        with state_store.locked_json(_STORE_NAME) as journals:
+            journals.setdefault(self.key, {"started_at": time.time(), "steps": {}})["completed_at"] = time.time()
+
+    def forget(self, step):
+        """Drop `step`'s output, so a retry runs it again."""
+        with state_store.locked_json(_STORE_NAME) as journals:
+            journals.get(self.key, {}).get("steps", {}).pop(step, None)
+        self.steps.pop(step, None)
+
+    def step(self, name, func):
+        """Wrap `func` to return `name`'s recorded output if it has one, and to record it otherwise."""
+        def run(**kwargs):
+            if name in self.steps:
+                return self.steps[name]
+            value = func(**kwargs)
+            self.record(name, value)
+            return value
+        return run
+
+class RunInFlight(Exception):
+    """Another attempt of the same run holds its lease."""
+
+def _owns(entry, lease):
+    return entry is not None and entry.get("lease") == lease
+
+@contextmanager
+def journal(key, lease_seconds, resume_completed=False):
+    """Open the journal for `key`, leasing the run to this attempt for `lease_seconds`.
+
+    The store is locked only while it is read or written, so unrelated runs don't wait on
+    each other. While the lease is live a concurrent attempt raises RunInFlight rather than
+    repeating its steps; once it is released or lapses (its holder died), the next attempt
+    resumes the run. A completed run's journal is started afresh unless `resume_completed`.
+    """
+    lease = os.urandom(8).hex()
+    with state_store.locked_json(_STORE_NAME) as journals:
+        now = time.time()
+        for stale in [k for k, e in journals.items() if e["started_at"] + JOURNAL_TTL_SECONDS <= now]:
+            del journals[stale]
+        entry = journals.get(key)
+        if entry is not None and entry.get("lease_until", 0) > now:
+            raise RunInFlight(f"Run {key} is in progress in another attempt")
+        if entry is None or (entry.get("completed_at") and not resume_completed):
+            entry = journals[key] = {"started_at": now, "steps": {}}
+        entry["lease"] = lease
+        entry["lease_until"] = now + lease_seconds
+        steps = dict(entry["steps"])
+    try:
+        yield Journal(key, steps)
+    finally:
+        try:
+            with state_store.locked_json(_STORE_NAME) as journals:
+                entry = journals.get(key)
+                if _owns(entry, lease):
+                    del entry["lease"], entry["lease_until"]
+        except TimeoutError:
+            pass  # Past the deadline the lease is left to lapse.